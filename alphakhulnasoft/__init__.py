@@ -1,14 +1,62 @@
 """
 AlphaKhulnasoft - AI Code Repair & Competitive Programming Engine
+
+The public classes are imported on first access, so `import alphakhulnasoft`
+stays cheap and optional heavy dependencies (matplotlib, pandas, seaborn,
+huggingface_hub, litellm) load only when the feature that needs them is used.
 """
 
-from .alpha_repair import AlphaRepairAgent as AlphaRepairAgent
-from .alpha_repair import FlowState as FlowState
-from .data_loader import DataLoader as DataLoader
-from .dataset_gen import generate_hard_problems as generate_hard_problems
-from .evaluator import Evaluator as Evaluator
-from .llm import LLMProvider as LLMProvider
-from .prompts import PromptRegistry as PromptRegistry
-from .publisher import HFPublisher as HFPublisher
-from .sandbox import Sandbox as Sandbox
-from .visualizer import AlphaPlotter as AlphaPlotter
+import importlib
+from typing import TYPE_CHECKING
+
+# Public name -> submodule defining it
+_LAZY_ATTRIBUTES = {
+    "AlphaRepairAgent": ".alpha_repair",
+    "FlowState": ".alpha_repair",
+    "ExecutionCache": ".cache",
+    "ResponseCache": ".cache",
+    "DataLoader": ".data_loader",
+    "generate_hard_problems": ".dataset_gen",
+    "Evaluator": ".evaluator",
+    "LLMProvider": ".llm",
+    "PromptRegistry": ".prompts",
+    "HFPublisher": ".publisher",
+    "ModelCascade": ".routing",
+    "Sandbox": ".sandbox",
+    "WarmSandbox": ".sandbox",
+    "CodeValidator": ".validation",
+    "AlphaPlotter": ".visualizer",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+if TYPE_CHECKING:
+    from .alpha_repair import AlphaRepairAgent as AlphaRepairAgent
+    from .alpha_repair import FlowState as FlowState
+    from .cache import ExecutionCache as ExecutionCache
+    from .cache import ResponseCache as ResponseCache
+    from .data_loader import DataLoader as DataLoader
+    from .dataset_gen import generate_hard_problems as generate_hard_problems
+    from .evaluator import Evaluator as Evaluator
+    from .llm import LLMProvider as LLMProvider
+    from .prompts import PromptRegistry as PromptRegistry
+    from .publisher import HFPublisher as HFPublisher
+    from .routing import ModelCascade as ModelCascade
+    from .sandbox import Sandbox as Sandbox
+    from .sandbox import WarmSandbox as WarmSandbox
+    from .validation import CodeValidator as CodeValidator
+    from .visualizer import AlphaPlotter as AlphaPlotter
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    # Later lookups find the attribute directly and skip this hook
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *__all__])
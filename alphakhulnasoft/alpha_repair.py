@@ -1,10 +1,34 @@
+import asyncio
+import contextvars
+import threading
 import uuid
-from dataclasses import dataclass, field
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from typing import Literal
 
-from .llm import LLMProvider
+from .budget import PromptBudget
+from .cache import ResponseCache
+from .llm import LLMError, LLMProvider, RateLimiter
 from .prompts import PromptRegistry
-from .sandbox import Sandbox
+from .routing import ModelCascade
+from .sandbox import MAX_LOGGED_FAILURES, TIME_LIMIT_EXCEEDED, Sandbox
+from .stagnation import (
+    MAX_TEMPERATURE,
+    TEMPERATURE_STEP,
+    code_fingerprint,
+    detect_stagnation,
+    failure_fingerprint,
+)
+from .tracing import annotate_span, summarize_spans, traced
+
+# Steps whose answer is code: their completions stop streaming at the closing fence
+CODE_STEPS = ("generate_solution", "targeted_repair")
+
+# (error log it analyses, snapshot of the state it runs on, pending analysis).
+# Its span goes to the snapshot's history and is only merged once the analysis is used.
+EarlyAnalysis = tuple[str, "FlowState", Future]
+AsyncEarlyAnalysis = tuple[str, "FlowState", asyncio.Task]
 
 
 # --- 1. The Shared State (The Brain) ---
@@ -17,121 +41,681 @@ class FlowState:
     constraints: str = ""  # Now stores the LLM analysis string
     current_code: str = ""
     tests: list[dict] = field(default_factory=list)  # [{'input': '...', 'expected': '...'}]
+    checker: str | None = None  # Output checker spec, see `checkers.get_checker`
     execution_logs: list[str] = field(default_factory=list)
     status: Literal["PENDING", "SOLVED", "FAILED", "REPAIRING"] = "PENDING"
     iterations: int = 0
     confidence_score: float = 0.0
     history: list[dict] = field(default_factory=list)  # Traceability
+    verdicts: dict[str, tuple[float, str]] = field(default_factory=dict)  # code -> known result
+    model_tier: int = 0  # Position in the agent's `ModelCascade`
+    tier_failures: int = 0  # Failed iterations on the current tier
+    temperature: float | None = None  # Raised by the "escalate" stagnation policy
+    sample: int = 0  # Bumped after stagnation so requests miss the response cache
+
+
+def _remember_verdict(state: FlowState, code: str, pass_rate: float, error_log: str):
+    # Like the sandbox's ExecutionCache: time limits depend on machine load and
+    # infrastructure errors say nothing about the code, so neither is reused
+    if TIME_LIMIT_EXCEEDED in error_log or "System Error" in error_log:
+        return
+    state.verdicts[code] = (pass_rate, error_log)
 
 
 # --- 2. The Agent Core ---
 class AlphaRepairAgent:
-    def __init__(self, model_name="gpt-4o", max_retries=5, prompt_registry=PromptRegistry):
+    """
+    Drives the Flow Engineering loop for one problem.
+    A step whose LLM call fails for good (`LLMError`) ends the flow as FAILED.
+    """
+
+    def __init__(
+        self,
+        model_name="gpt-4o",
+        max_retries=5,
+        prompt_registry=PromptRegistry,
+        sandbox: Sandbox | None = None,
+        response_cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        num_candidates: int = 1,
+        sampling_temperature: float | None = None,
+        prompt_budget: PromptBudget | None = None,
+        stream_code: bool = True,
+        cascade: ModelCascade | None = None,
+        step_models: dict[str, str] | None = None,
+        pipeline_analysis: bool = False,
+        pipeline_min_failures: int = MAX_LOGGED_FAILURES,
+        stagnation_policy: Literal["stop", "restart", "escalate"] | None = "stop",
+        stagnation_window: int = 3,
+    ):
+        """
+        - `num_candidates`: > 1 makes generation/repair a best-of-N search; the
+          candidates are sandboxed concurrently and the first to pass all tests wins.
+        - `prompt_budget`: trims error logs to keep each step under its token cap.
+        - `stream_code`: code steps stop reading the completion at the closing fence.
+        - `cascade` / `step_models`: which model each step uses (see `ModelCascade`).
+        - `pipeline_analysis`: start the root-cause analysis once a test run has
+          logged `pipeline_min_failures` failures (or the sandbox's `max_failures`).
+        - `stagnation_policy`: "stop", "restart" or "escalate" when the loop stalls
+          for `stagnation_window` versions (see `stagnation`); None keeps going.
+        """
         self.model = model_name
         self.max_retries = max_retries
-        self.llm = LLMProvider(model=model_name)
+        self.num_candidates = num_candidates
+        self.sampling_temperature = sampling_temperature
+        self.llm = LLMProvider(model=model_name, cache=response_cache, rate_limiter=rate_limiter)
         self.prompts = prompt_registry
-        self.sandbox = Sandbox(timeout_seconds=2)
+        self.prompt_budget = prompt_budget or PromptBudget(model_name)
+        self.stream_code = stream_code
+        self.sandbox = sandbox or Sandbox(timeout_seconds=2)
+        self.cascade = cascade
+        self.step_models = step_models or {}
+        self._providers = {model_name: self.llm}
+        self.pipeline_analysis = pipeline_analysis
+        self.pipeline_min_failures = pipeline_min_failures
+        self.stagnation_policy = stagnation_policy
+        self.stagnation_window = stagnation_window
 
-    def run_flow(self, problem_description: str, tests: list[dict] | None = None) -> dict:
+    def run_flow(
+        self, problem_description: str, tests: list[dict] | None = None, checker: str | None = None
+    ) -> dict:
         """Entry point for the Flow Engineering loop."""
-        state = FlowState(problem_desc=problem_description, tests=tests or [])
+        state = FlowState(problem_desc=problem_description, tests=tests or [], checker=checker)
+
+        print(f"🚀 [AlphaFlow] Starting Logic Flow for Problem ID: {state.id}")
+
+        try:
+            # Step 1: Semantic Analysis (System 2 Thinking)
+            state = self.step_semantic_analysis(state)
+
+            # Step 2: Initial Generation
+            state = self.step_generate_solution(state)
+
+            # Step 3: The Repair Loop
+            while state.iterations < self.max_retries and state.status != "SOLVED":
+                state.iterations += 1
+                print(f"🔄 [AlphaFlow] Iteration {state.iterations}/{self.max_retries}")
+
+                # A. Testing (pipelined: B. may already be underway when it returns)
+                pass_rate, error_log, early = self._execute_tests(state)
+
+                if pass_rate == 1.0:
+                    state.status = "SOLVED"
+                    state.confidence_score = 1.0
+                    print("✅ [AlphaFlow] Solution Verified!")
+                    break
+
+                self._record_failure(state, error_log)
+
+                # No progress: stop, or start over before spending more calls on this line
+                action = self._check_progress(state, pass_rate, error_log)
+                if action in ("stop", "restart") and early is not None:
+                    early[2].cancel()
+                if action == "stop":
+                    break
+                if action == "restart":
+                    state = self.step_generate_solution(state)
+                    continue
+
+                # B. Root Cause Analysis
+                root_cause = self._root_cause(state, error_log, early)
+                print(f"🧐 [Analysis] {root_cause[:100]}...")
+
+                # C. Targeted Repair
+                state = self.step_apply_fix(state, root_cause, error_log)
+        except LLMError as e:
+            self._abort(state, e)
+
+        return self._finalize_result(state)
+
+    async def arun_flow(
+        self, problem_description: str, tests: list[dict] | None = None, checker: str | None = None
+    ) -> dict:
+        """
+        Asyncio version of `run_flow`: LLM calls go through `LLMProvider.acomplete`
+        and the sandbox runs in a worker thread, so many flows can share one loop.
+        """
+        state = FlowState(problem_desc=problem_description, tests=tests or [], checker=checker)
 
         print(f"🚀 [AlphaFlow] Starting Logic Flow for Problem ID: {state.id}")
 
-        # Step 1: Semantic Analysis (System 2 Thinking)
-        state = self.step_semantic_analysis(state)
+        try:
+            state = await self.astep_semantic_analysis(state)
+            state = await self.astep_generate_solution(state)
+
+            while state.iterations < self.max_retries and state.status != "SOLVED":
+                state.iterations += 1
+                print(f"🔄 [AlphaFlow] Iteration {state.iterations}/{self.max_retries}")
 
-        # Step 2: Initial Generation
-        state = self.step_generate_solution(state)
+                pass_rate, error_log, early = await self._aexecute_tests(state)
 
-        # Step 3: The Repair Loop
-        while state.iterations < self.max_retries and state.status != "SOLVED":
-            state.iterations += 1
-            print(f"🔄 [AlphaFlow] Iteration {state.iterations}/{self.max_retries}")
+                if pass_rate == 1.0:
+                    state.status = "SOLVED"
+                    state.confidence_score = 1.0
+                    print("✅ [AlphaFlow] Solution Verified!")
+                    break
 
-            # A. Testing
-            pass_rate, error_log = self.step_execute_tests(state)
+                self._record_failure(state, error_log)
 
-            if pass_rate == 1.0:
-                state.status = "SOLVED"
-                state.confidence_score = 1.0
-                print("✅ [AlphaFlow] Solution Verified!")
-                break
+                action = self._check_progress(state, pass_rate, error_log)
+                if action in ("stop", "restart") and early is not None:
+                    early[2].cancel()
+                if action == "stop":
+                    break
+                if action == "restart":
+                    state = await self.astep_generate_solution(state)
+                    continue
 
-            # B. Root Cause Analysis
-            root_cause = self.step_analyze_failure(state, error_log)
-            print(f"🧐 [Analysis] {root_cause[:100]}...")
+                root_cause = await self._aroot_cause(state, error_log, early)
+                print(f"🧐 [Analysis] {root_cause[:100]}...")
 
-            # C. Targeted Repair
-            state = self.step_apply_fix(state, root_cause, error_log)
+                state = await self.astep_apply_fix(state, root_cause, error_log)
+        except LLMError as e:
+            self._abort(state, e)
 
         return self._finalize_result(state)
 
     # --- 3. Flow Steps (The "Nodes") ---
 
+    @traced
     def step_semantic_analysis(self, state: FlowState) -> FlowState:
         """Extracts hard constraints and edge cases."""
         print("🧠 [Analysis] Extracting Constraints via Registry...")
-        prompt = self.prompts.semantic_analysis(state.problem_desc)
-        state.constraints = self.llm.complete(
-            prompt, system_prompt="You are an expert algorithm analyst."
-        )
+        request = self._request(state, "semantic_analysis")
+        state.constraints = self._llm(state, "semantic_analysis").complete(**request)
         return state
 
+    @traced
     def step_generate_solution(self, state: FlowState) -> FlowState:
         """Generates code based on constraints."""
         print("✍️ [Generator] Drafting initial solution...")
-        prompt = self.prompts.generate_solution(state.problem_desc, state.constraints)
-        raw_code = self.llm.complete(
-            prompt,
-            system_prompt="You are a senior software engineer. Return only code that uses stdin/stdout.",
-        )
+        request = self._request(state, "generate_solution")
+        llm = self._llm(state, "generate_solution")
+        if self.num_candidates > 1:
+            state.current_code = self._search_candidates(state, llm, request)
+            return state
+        raw_code = llm.complete(**request)
         state.current_code = self._clean_markdown(raw_code)
         return state
 
-    def step_execute_tests(self, state: FlowState) -> tuple[float, str]:
+    @traced
+    def step_execute_tests(
+        self, state: FlowState, on_failure: Callable[[str, int], None] | None = None
+    ) -> tuple[float, str]:
         """Runs the code in the Sandbox against provided tests."""
         print("⚡ [Runtime] Executing tests in Sandbox...")
         if not state.tests:
             return 0.0, "No tests provided to verify solution."
 
-        pass_rate, error_log = self.sandbox.run_tests(state.current_code, state.tests)
+        known = state.verdicts.get(state.current_code)
+        if known is not None:
+            # Already sandboxed during candidate search
+            pass_rate, error_log = known
+        else:
+            pass_rate, error_log = self.sandbox.run_tests(
+                state.current_code, state.tests, checker=state.checker, on_failure=on_failure
+            )
+            # A repair that comes back to this code is answered without the sandbox
+            _remember_verdict(state, state.current_code, pass_rate, error_log)
         state.confidence_score = pass_rate
 
         return pass_rate, error_log
 
+    @traced
     def step_analyze_failure(self, state: FlowState, error_log: str) -> str:
         """The 'Reasoning' Step."""
         print("🕵️ [Debugger] Analyzing Root Cause...")
-        prompt = self.prompts.analyze_failure(state.current_code, error_log, state.problem_desc)
-        return str(
-            self.llm.complete(prompt, system_prompt="You are a world-class debugging agent.")
+        request = self._request(
+            state, "analyze_failure", code=state.current_code, error_log=error_log
         )
+        return str(self._llm(state, "analyze_failure").complete(**request))
 
+    @traced
     def step_apply_fix(self, state: FlowState, root_cause: str, error_log: str) -> FlowState:
         """Writes the patch based on the analysis."""
         print("🔧 [Repair] Applying fix...")
-        prompt = self.prompts.targeted_repair(state.current_code, root_cause)
-        raw_code = self.llm.complete(prompt, system_prompt="You are a senior software engineer.")
+        request = self._request(
+            state, "targeted_repair", code=state.current_code, root_cause=root_cause
+        )
+        llm = self._llm(state, "targeted_repair")
+        if self.num_candidates > 1:
+            state.current_code = self._search_candidates(state, llm, request)
+        else:
+            raw_code = llm.complete(**request)
+            state.current_code = self._clean_markdown(raw_code)
+
+        state.history.append(
+            {
+                "iter": state.iterations,
+                "kind": "repair",
+                "model": llm.model,
+                "cause": root_cause,
+                "error": error_log,
+            }
+        )
+        return state
+
+    # Async twins of the LLM-bound steps, used by `arun_flow`
+
+    @traced
+    async def astep_semantic_analysis(self, state: FlowState) -> FlowState:
+        print("🧠 [Analysis] Extracting Constraints via Registry...")
+        request = self._request(state, "semantic_analysis")
+        state.constraints = await self._llm(state, "semantic_analysis").acomplete(**request)
+        return state
+
+    @traced
+    async def astep_generate_solution(self, state: FlowState) -> FlowState:
+        print("✍️ [Generator] Drafting initial solution...")
+        request = self._request(state, "generate_solution")
+        llm = self._llm(state, "generate_solution")
+        if self.num_candidates > 1:
+            state.current_code = await self._asearch_candidates(state, llm, request)
+            return state
+        raw_code = await llm.acomplete(**request)
         state.current_code = self._clean_markdown(raw_code)
+        return state
 
-        state.history.append({"iter": state.iterations, "cause": root_cause, "error": error_log})
+    @traced
+    async def astep_analyze_failure(self, state: FlowState, error_log: str) -> str:
+        print("🕵️ [Debugger] Analyzing Root Cause...")
+        request = self._request(
+            state, "analyze_failure", code=state.current_code, error_log=error_log
+        )
+        return str(await self._llm(state, "analyze_failure").acomplete(**request))
+
+    @traced
+    async def astep_apply_fix(self, state: FlowState, root_cause: str, error_log: str) -> FlowState:
+        print("🔧 [Repair] Applying fix...")
+        request = self._request(
+            state, "targeted_repair", code=state.current_code, root_cause=root_cause
+        )
+        llm = self._llm(state, "targeted_repair")
+        if self.num_candidates > 1:
+            state.current_code = await self._asearch_candidates(state, llm, request)
+        else:
+            raw_code = await llm.acomplete(**request)
+            state.current_code = self._clean_markdown(raw_code)
+
+        state.history.append(
+            {
+                "iter": state.iterations,
+                "kind": "repair",
+                "model": llm.model,
+                "cause": root_cause,
+                "error": error_log,
+            }
+        )
         return state
 
+    # Pipelined analysis
+
+    def _execute_tests(self, state: FlowState) -> tuple[float, str, EarlyAnalysis | None]:
+        """`step_execute_tests`, starting the failure analysis early when pipelining."""
+        if not self.pipeline_analysis:
+            return (*self.step_execute_tests(state), None)
+
+        early: list[EarlyAnalysis] = []
+        executor = ThreadPoolExecutor(max_workers=1)
+        trigger = self._pipeline_trigger()
+
+        def on_failure(error_log: str, failures: int):
+            if early or failures < trigger:
+                return
+            print("⏩ [Pipeline] Analyzing failures while the remaining tests run...")
+            snapshot = replace(state, history=[])
+            # A copy of the context, so the analysis gets its own span, not the test run's
+            future = executor.submit(
+                contextvars.copy_context().run, self.step_analyze_failure, snapshot, error_log
+            )
+            early.append((error_log, snapshot, future))
+
+        try:
+            pass_rate, error_log = self.step_execute_tests(state, on_failure=on_failure)
+        finally:
+            executor.shutdown(wait=False)
+        return pass_rate, error_log, early[0] if early else None
+
+    async def _aexecute_tests(
+        self, state: FlowState
+    ) -> tuple[float, str, AsyncEarlyAnalysis | None]:
+        """Async `_execute_tests`: the early analysis is a task on the flow's event loop."""
+        if not self.pipeline_analysis:
+            return (*await asyncio.to_thread(self.step_execute_tests, state), None)
+
+        loop = asyncio.get_running_loop()
+        early: list[AsyncEarlyAnalysis] = []
+        started = threading.Event()
+        trigger = self._pipeline_trigger()
+
+        def start(error_log: str, snapshot: FlowState):
+            task = asyncio.create_task(self.astep_analyze_failure(snapshot, error_log))
+            early.append((error_log, snapshot, task))
+
+        def on_failure(error_log: str, failures: int):
+            # Runs on the sandbox thread; the task is created back on the loop
+            if started.is_set() or failures < trigger:
+                return
+            started.set()
+            print("⏩ [Pipeline] Analyzing failures while the remaining tests run...")
+            loop.call_soon_threadsafe(start, error_log, replace(state, history=[]))
+
+        pass_rate, error_log = await asyncio.to_thread(self.step_execute_tests, state, on_failure)
+        return pass_rate, error_log, early[0] if early else None
+
+    def _pipeline_trigger(self) -> int:
+        """Failures after which the analysis starts; a run never logs more than `max_failures`."""
+        if self.sandbox.max_failures:
+            return min(self.pipeline_min_failures, self.sandbox.max_failures)
+        return self.pipeline_min_failures
+
+    def _root_cause(self, state: FlowState, error_log: str, early: EarlyAnalysis | None) -> str:
+        if early is not None:
+            analysed_log, snapshot, future = early
+            if analysed_log == error_log and snapshot.model_tier == state.model_tier:
+                try:
+                    return str(future.result())
+                finally:
+                    state.history.extend(snapshot.history)
+            # A thread cannot be stopped; the stale analysis is booked once it finishes
+            future.add_done_callback(lambda _: state.history.extend(snapshot.history))
+            print("🔁 [Pipeline] The final log differs, refining the analysis...")
+        return str(self.step_analyze_failure(state, error_log))
+
+    async def _aroot_cause(
+        self, state: FlowState, error_log: str, early: AsyncEarlyAnalysis | None
+    ) -> str:
+        if early is not None:
+            analysed_log, snapshot, task = early
+            if analysed_log == error_log and snapshot.model_tier == state.model_tier:
+                try:
+                    return str(await task)
+                finally:
+                    state.history.extend(snapshot.history)
+            print("🔁 [Pipeline] The final log differs, refining the analysis...")
+            task.cancel()
+        return str(await self.astep_analyze_failure(state, error_log))
+
+    # Best-of-N candidate search
+
+    def _search_candidates(self, state: FlowState, llm: LLMProvider, request: dict) -> str:
+        """Samples candidates on worker threads and returns the best code."""
+        print(f"🎲 [Search] Sampling {self.num_candidates} candidates...")
+        stop = threading.Event()
+        errors: list[LLMError] = []
+
+        def attempt(sample: int) -> tuple[int, str, float, str] | None:
+            try:
+                raw_code = llm.complete(**self._draw(request, sample))
+            except LLMError as e:
+                errors.append(e)
+                return None
+            if stop.is_set():
+                return None
+            return (sample, *self._evaluate_candidate(state, raw_code, stop))
+
+        executor = ThreadPoolExecutor(max_workers=self.num_candidates)
+        # Each thread gets a copy of the context so LLM usage lands in the current span
+        futures = [
+            executor.submit(contextvars.copy_context().run, attempt, sample)
+            for sample in range(self.num_candidates)
+        ]
+        candidates = []
+        try:
+            for future in as_completed(futures):
+                candidate = future.result()
+                if candidate is None:
+                    continue
+                candidates.append(candidate)
+                self._record_candidate(state, *candidate)
+                if candidate[2] == 1.0:
+                    break
+        finally:
+            # In-flight LLM calls cannot be interrupted; their results are ignored
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if not candidates and errors:
+            raise errors[-1]
+        return self._select_candidate(state, candidates)
+
+    async def _asearch_candidates(self, state: FlowState, llm: LLMProvider, request: dict) -> str:
+        """Async `_search_candidates`: pending LLM calls are cancelled once one candidate passes."""
+        print(f"🎲 [Search] Sampling {self.num_candidates} candidates...")
+        stop = threading.Event()
+        errors: list[LLMError] = []
+
+        async def attempt(sample: int) -> tuple[int, str, float, str] | None:
+            try:
+                raw_code = await llm.acomplete(**self._draw(request, sample))
+            except LLMError as e:
+                errors.append(e)
+                return None
+            verdict = await asyncio.to_thread(self._evaluate_candidate, state, raw_code, stop)
+            return (sample, *verdict)
+
+        tasks = [asyncio.create_task(attempt(sample)) for sample in range(self.num_candidates)]
+        candidates = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                candidate = await next_done
+                if candidate is None:
+                    continue
+                candidates.append(candidate)
+                self._record_candidate(state, *candidate)
+                if candidate[2] == 1.0:
+                    break
+        finally:
+            stop.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if not candidates and errors:
+            raise errors[-1]
+        return self._select_candidate(state, candidates)
+
+    def _draw(self, request: dict, sample: int) -> dict:
+        """Request for candidate `sample`, at the flow's temperature if it was escalated."""
+        return {
+            **request,
+            "temperature": request.get("temperature", self.sampling_temperature),
+            "sample": request.get("sample", 0) * self.num_candidates + sample,
+        }
+
+    def _evaluate_candidate(
+        self, state: FlowState, raw_code: str, stop: threading.Event
+    ) -> tuple[str, float, str]:
+        code = self._clean_markdown(raw_code)
+        if not state.tests:
+            return code, 0.0, "No tests provided to verify solution."
+        pass_rate, error_log = self.sandbox.run_tests(
+            code, state.tests, stop_event=stop, checker=state.checker
+        )
+        return code, pass_rate, error_log
+
+    def _record_candidate(
+        self, state: FlowState, sample: int, code: str, pass_rate: float, error_log: str
+    ):
+        _remember_verdict(state, code, pass_rate, error_log)
+        state.history.append(
+            {
+                "iter": state.iterations,
+                "kind": "candidate",
+                "sample": sample,
+                "code": code,
+                "pass_rate": pass_rate,
+                "error": error_log,
+            }
+        )
+
+    def _select_candidate(self, state: FlowState, candidates: list[tuple]) -> str:
+        """Highest pass rate wins; ties go to the candidate that finished first."""
+        if not candidates:
+            return state.current_code
+        sample, code, pass_rate, _ = max(candidates, key=lambda candidate: candidate[2])
+        print(f"🏅 [Search] Candidate #{sample + 1} selected (pass rate {pass_rate:.0%})")
+        return str(code)
+
+    def _request(self, state: FlowState, step: str, **fields: str) -> dict:
+        """
+        `LLMProvider.complete` arguments for a step: the shared system prompt and
+        problem/analysis prefix, then the step's own prompt, all within its token budget.
+        """
+        # Registries written before the shared prefix may lack it
+        shared_context = getattr(self.prompts, "shared_context", PromptRegistry.shared_context)
+        context = shared_context(state.problem_desc, state.constraints)
+        legacy_fields = {
+            "semantic_analysis": {"problem_description": state.problem_desc},
+            "generate_solution": {
+                "problem_desc": state.problem_desc,
+                "analysis": state.constraints,
+            },
+            "analyze_failure": {"problem_desc": state.problem_desc},
+        }.get(step, {})
+        context, prompt = self.prompt_budget.fit(
+            step, getattr(self.prompts, step), context=context, **legacy_fields, **fields
+        )
+        request = {
+            "prompt": prompt,
+            "system_prompt": getattr(self.prompts, "SYSTEM_PROMPT", PromptRegistry.SYSTEM_PROMPT),
+            "context": context,
+            "stop_at_code": self.stream_code and step in CODE_STEPS,
+        }
+        if state.temperature is not None:
+            request["temperature"] = state.temperature
+        if state.sample:
+            request["sample"] = state.sample
+        return request
+
+    def _llm(self, state: FlowState, step: str) -> LLMProvider:
+        """Provider for `step` in this flow's current tier, noted on the step's span."""
+        if step in self.step_models:
+            model = self.step_models[step]
+        elif self.cascade is not None:
+            model = self.cascade.tiers[state.model_tier]
+        else:
+            model = self.model
+        annotate_span(model=model)
+        if model not in self._providers:
+            self._providers[model] = LLMProvider(
+                model=model,
+                cache=self.llm.cache,
+                rate_limiter=self.llm.rate_limiter,
+                timeout=self.llm.timeout,
+                max_attempts=self.llm.max_attempts,
+                backoff_seconds=self.llm.backoff_seconds,
+                max_backoff_seconds=self.llm.max_backoff_seconds,
+                hedge_quantile=self.llm.hedge_quantile,
+            )
+        return self._providers[model]
+
+    def _record_failure(self, state: FlowState, error_log: str):
+        """Counts a failed iteration and moves the flow up the cascade when it calls for it."""
+        if self.cascade is None:
+            return
+        state.tier_failures += 1
+        reason = self.cascade.escalation_reason(state.model_tier, state.tier_failures, error_log)
+        if reason is not None:
+            self._escalate_tier(state, reason)
+
+    def _escalate_tier(self, state: FlowState, reason: str) -> bool:
+        """Moves the flow one cascade tier up; False if it is already on the last one."""
+        if self.cascade is None or state.model_tier + 1 >= len(self.cascade.tiers):
+            return False
+        previous = self.cascade.tiers[state.model_tier]
+        state.model_tier += 1
+        state.tier_failures = 0
+        model = self.cascade.tiers[state.model_tier]
+        print(f"⬆️ [Router] Escalating {previous} -> {model} ({reason})")
+        state.history.append(
+            {
+                "iter": state.iterations,
+                "kind": "escalation",
+                "from": previous,
+                "to": model,
+                "reason": reason,
+            }
+        )
+        return True
+
+    def _check_progress(self, state: FlowState, pass_rate: float, error_log: str) -> str | None:
+        """
+        Records the tested version as an "attempt" and applies `stagnation_policy`
+        if the loop stopped making progress. Returns "stop", "restart", "continue"
+        (escalated, keep repairing) or None (making progress).
+        """
+        state.history.append(
+            {
+                "iter": state.iterations,
+                "kind": "attempt",
+                "code": code_fingerprint(state.current_code),
+                "failure": failure_fingerprint(error_log),
+                "pass_rate": pass_rate,
+            }
+        )
+        if self.stagnation_policy is None:
+            return None
+
+        # Only what happened since the last reaction counts towards the next one
+        attempts: list[dict] = []
+        for entry in state.history:
+            if entry.get("kind") == "stagnation":
+                attempts = []
+            elif entry.get("kind") == "attempt":
+                attempts.append(entry)
+        reason = detect_stagnation(attempts, self.stagnation_window)
+        if reason is None:
+            return None
+
+        action = self.stagnation_policy
+        if action == "escalate":
+            base = state.temperature if state.temperature is not None else self.sampling_temperature
+            temperature = min((base or 0.0) + TEMPERATURE_STEP, MAX_TEMPERATURE)
+            escalated = self._escalate_tier(state, reason)
+            if temperature > (base or 0.0) or escalated:
+                state.temperature = temperature
+            else:
+                action = "stop"
+        if action == "stop":
+            # Given up on, unlike a flow that is still PENDING
+            state.status = "FAILED"
+        else:
+            state.sample += 1
+
+        print(f"🔁 [AlphaFlow] No progress ({reason}): {action}")
+        state.history.append(
+            {"iter": state.iterations, "kind": "stagnation", "reason": reason, "action": action}
+        )
+        return "continue" if action == "escalate" else action
+
+    def _abort(self, state: FlowState, error: LLMError):
+        """Ends a flow whose LLM calls keep failing, instead of sandboxing an error message."""
+        print(f"💥 [AlphaFlow] Giving up: {error}")
+        state.status = "FAILED"
+        state.history.append({"iter": state.iterations, "kind": "error", "error": str(error)})
+
     def _clean_markdown(self, text: str) -> str:
         """Helper to strip markdown ticks."""
         return str(self.llm.extract_code(text))
 
     def _finalize_result(self, state: FlowState) -> dict:
         """Formatting for the Leaderboard."""
+        spans = [h for h in state.history if h.get("kind") == "span"]
+        stages = summarize_spans(spans)
         return {
             "solution": state.current_code,
             "status": state.status,
+            "spans": spans,
+            "stagnation": [h for h in state.history if h.get("kind") == "stagnation"],
             "metrics": {
                 "iterations": state.iterations,
                 "confidence": state.confidence_score,
-                "flow_depth": len(state.history),
+                "flow_depth": sum(1 for h in state.history if h.get("kind") == "repair"),
+                "prompt_tokens": sum(stage["prompt_tokens"] for stage in stages.values()),
+                "completion_tokens": sum(stage["completion_tokens"] for stage in stages.values()),
+                "cached_tokens": sum(stage["cached_tokens"] for stage in stages.values()),
+                "cost": round(sum(stage["cost"] for stage in stages.values()), 6),
             },
         }
 
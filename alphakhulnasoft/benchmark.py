@@ -1,25 +1,72 @@
+import asyncio
+import datetime
 import os
+import subprocess
+import sys
 import time
+from collections.abc import Callable
 
 from .alpha_repair import AlphaRepairAgent
+from .cache import ExecutionCache, ResponseCache
 from .data_loader import DataLoader
 from .evaluator import Evaluator
+from .llm import RateLimiter
 from .prompts import PromptRegistry
+from .results import ResultSink, load_results, merge_results
+from .sandbox import Sandbox
 
 
-def run_benchmark(dataset_path: str | None = None, limit: int = 5):
+def run_benchmark(
+    dataset_path: str | None = None,
+    limit: int = 5,
+    execution_cache_path: str | None = None,
+    response_cache_path: str | None = None,
+    replay_only: bool = False,
+    concurrency: int = 1,
+    requests_per_minute: int | None = None,
+    tokens_per_minute: int | None = None,
+    results_path: str | None = None,
+    resume: bool = False,
+    shard: tuple[int, int] | None = None,
+    model: str = "gpt-4o",
+):
     """
     Orchestrates the AlphaKhulnasoft v2 Benchmark.
+    All agents share one sandbox execution cache; pass `execution_cache_path`
+    to persist it in SQLite across reruns.
+    `response_cache_path` records LLM responses so reruns cost no tokens;
+    with `replay_only` the run never calls a provider (e.g. offline CI).
+    `concurrency` > 1 solves that many problems at once on an asyncio loop,
+    throttled by the optional per-minute request/token limits.
+    Each problem's row is appended to `results_path` (JSONL) as soon as it is
+    solved; with `resume` the problems already in that file are skipped, without
+    it a file that already holds rows raises FileExistsError.
+    `shard=(i, n)` runs only every n-th problem starting at i; see `run_sharded`.
+    `model="fake/repair?latency=0.5"` (see `fake_llm`) runs the whole pipeline
+    offline, e.g. to load-test concurrency, retries and the sandbox.
     """
     # 1. Setup
     loader = DataLoader()
     evaluator = Evaluator()
+    execution_cache = ExecutionCache(path=execution_cache_path)
+    response_cache = (
+        ResponseCache(path=response_cache_path, replay_only=replay_only)
+        if response_cache_path
+        else None
+    )
+    sandbox = Sandbox(timeout_seconds=2, cache=execution_cache)
+    rate_limiter = (
+        RateLimiter(requests_per_minute, tokens_per_minute)
+        if requests_per_minute or tokens_per_minute
+        else None
+    )
 
     # Load real data or use mock if path is None
-    problems = loader.load_problems(dataset_path) if dataset_path else [loader.get_mock_problem()]
-
-    # Add another mock problem if it's the default run
-    if not dataset_path:
+    if dataset_path:
+        problems = list(loader.load_problems(dataset_path, limit=limit, shard=shard))
+    else:
+        problems = [loader.get_mock_problem()]
+        # Add another mock problem if it's the default run
         problems.append(
             {
                 "id": "mock-002",
@@ -32,86 +79,267 @@ def run_benchmark(dataset_path: str | None = None, limit: int = 5):
                 ],
             }
         )
+        problems = problems[:limit]
+        if shard is not None:
+            problems = problems[shard[0] :: shard[1]]
+
+    if results_path is None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        results_path = f"results_{timestamp}.jsonl"
+    sink = ResultSink(results_path)
+    if not resume and sink.completed_ids():
+        # Appending a second run would count every problem twice
+        raise FileExistsError(f"{results_path} already holds results; resume it or pick a new file")
 
-    problems = problems[:limit]
+    # Number problems by their position in the unsharded dataset
+    shard_index, shard_count = shard or (0, 1)
+    pending = [(shard_index + k * shard_count, p) for k, p in enumerate(problems)]
+    if resume:
+        done = sink.completed_ids()
+        pending = [(i, p) for i, p in pending if _problem_id(i, p) not in done]
+        print(f"⏩ Resuming: {len(problems) - len(pending)} problems already in {results_path}")
 
-    print(f"🔥 Starting AlphaKhulnasoft v2 Benchmark on {len(problems)} problems...")
-    print("   Model: GPT-4o (via litellm)")
+    print(f"🔥 Starting AlphaKhulnasoft v2 Benchmark on {len(pending)} problems...")
+    print(f"   Model: {model} (via litellm)")
     print("   Strategy: Flow Engineering v2\n")
 
-    results = []
+    def make_agent() -> AlphaRepairAgent:
+        # Initialize the Agent (injecting the Prompts)
+        return AlphaRepairAgent(
+            model_name=model,
+            prompt_registry=PromptRegistry,
+            sandbox=sandbox,
+            response_cache=response_cache,
+            rate_limiter=rate_limiter,
+        )
 
-    # 2. The Contest Loop
-    for i, problem in enumerate(problems):
-        title = problem.get("title", "Unknown")
-        print(f"⚔️  Problem {i + 1}: {title}")
+    # 2. The Contest Loop (the lock keeps two processes off the same results file)
+    with sink.claim():
+        if concurrency > 1:
+            asyncio.run(_run_concurrently(pending, make_agent, evaluator, sink, concurrency))
+        else:
+            for i, problem in pending:
+                print(f"⚔️  Problem {i + 1}: {problem.get('title', 'Unknown')}")
+                agent = make_agent()
 
-        # Initialize the Agent (injecting the Prompts)
-        agent = AlphaRepairAgent(model_name="gpt-4o", prompt_registry=PromptRegistry)
+                start_time = time.time()
 
-        start_time = time.time()
+                # --- RUN THE FLOW ---
+                # Pass tests directly from the problem definition
+                try:
+                    solution_data = agent.run_flow(
+                        problem["description"],
+                        tests=problem.get("tests"),
+                        checker=problem.get("checker"),
+                    )
+                except Exception as e:
+                    solution_data = _crashed_flow(e)
+                # --------------------
 
-        # --- RUN THE FLOW ---
-        # Pass tests directly from the problem definition
-        solution_data = agent.run_flow(problem["description"], tests=problem.get("tests"))
-        # --------------------
+                duration = time.time() - start_time
+                sink.write(_record_result(i, problem, solution_data, duration, evaluator))
 
-        duration = time.time() - start_time
+    # 4. Final Leaderboard (including rows from earlier, resumed runs)
+    evaluator.print_leaderboard(load_results(results_path) if os.path.exists(results_path) else [])
+    cache_stats = execution_cache.stats()
+    print(f"🗄️  Sandbox cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    execution_cache.close()
+    if response_cache is not None:
+        llm_stats = response_cache.stats()
+        print(f"🗄️  LLM cache: {llm_stats['hits']} hits / {llm_stats['misses']} misses")
+        response_cache.close()
 
-        # 3. Evaluation (Adjudication)
-        is_solved = solution_data["status"] == "SOLVED"
+    print(f"💾 Benchmark results saved to {results_path}")
+    return results_path
 
-        metrics = {
-            "id": problem.get("id", str(i + 1)),
-            "pass": is_solved,
-            "iterations": solution_data["metrics"]["iterations"],
-            "confidence": solution_data["metrics"]["confidence"],
-            "duration": round(duration, 2),
-            "cost_score": evaluator.calculate_efficiency_score(
-                is_solved, solution_data["metrics"]["iterations"]
-            ),
-        }
 
-        results.append(metrics)
+def run_sharded(
+    dataset_path: str | None,
+    workers: int,
+    results_path: str,
+    limit: int = 5,
+    resume: bool = False,
+    extra_args: list[str] | None = None,
+) -> str:
+    """
+    Splits the benchmark across `workers` local processes, one shard each.
+    Shard i writes `<results_path stem>.shard-i-of-n.jsonl`; once all shards
+    finish, their files are merged into `results_path`.
+    On several machines, run the shards by hand with `--shard i/n` and merge
+    the files with `python -m alphakhulnasoft.results merge`.
+    """
+    stem = results_path.removesuffix(".jsonl")
+    shard_paths = [f"{stem}.shard-{i}-of-{workers}.jsonl" for i in range(workers)]
+    if not resume:
+        for path in [results_path, *shard_paths]:
+            if ResultSink(path).completed_ids():
+                raise FileExistsError(f"{path} already holds results; resume it or pick a new file")
 
-        # Live Feedback
-        icon = "✅" if is_solved else "❌"
-        print(
-            f"   {icon} Result: {solution_data['status']} | Iters: {metrics['iterations']} | Time: {metrics['duration']}s\n"
-        )
+    processes = []
+    for i, shard_path in enumerate(shard_paths):
+        cmd = [sys.executable, "-m", "alphakhulnasoft.benchmark"]
+        if dataset_path:
+            cmd.append(dataset_path)
+        cmd += ["--limit", str(limit), "--shard", f"{i}/{workers}", "--results", shard_path]
+        if resume:
+            cmd.append("--resume")
+        processes.append(subprocess.Popen(cmd + (extra_args or [])))
+
+    failed = [i for i, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        print(f"⚠️ Shards {failed} exited with errors; merging what they wrote.")
+
+    rows = merge_results([p for p in shard_paths if os.path.exists(p)], results_path)
+    Evaluator().print_leaderboard(rows)
+    print(f"💾 Merged results of {workers} shards saved to {results_path}")
+    return results_path
 
-    # 4. Final Leaderboard
-    evaluator.print_leaderboard(results)
 
-    # 5. Save Results
-    import datetime
-    import json
+async def _run_concurrently(
+    problems: list[tuple[int, dict]],
+    make_agent: Callable[[], AlphaRepairAgent],
+    evaluator: Evaluator,
+    sink: ResultSink,
+    concurrency: int,
+):
+    """Runs up to `concurrency` flows at once, streaming each row to the sink."""
+    semaphore = asyncio.Semaphore(concurrency)
 
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"results_{timestamp}.json"
+    async def solve(i: int, problem: dict):
+        async with semaphore:
+            print(f"⚔️  Problem {i + 1}: {problem.get('title', 'Unknown')}")
+            agent = make_agent()
+            start_time = time.time()
+            try:
+                solution_data = await agent.arun_flow(
+                    problem["description"],
+                    tests=problem.get("tests"),
+                    checker=problem.get("checker"),
+                )
+            except Exception as e:
+                # One broken flow must not take the other in-flight problems down with it
+                solution_data = _crashed_flow(e)
+            duration = time.time() - start_time
+            sink.write(_record_result(i, problem, solution_data, duration, evaluator))
 
-    with open(filename, "w") as f:
-        json.dump(results, f, indent=2)
+    await asyncio.gather(*(solve(i, p) for i, p in problems))
 
-    print(f"💾 Benchmark results saved to {filename}")
-    return filename
+
+def _crashed_flow(error: Exception) -> dict:
+    """Flow result standing in for a flow that raised instead of returning."""
+    print(f"💥 [AlphaFlow] Flow crashed: {type(error).__name__}: {error}")
+    return {
+        "solution": "",
+        "status": "FAILED",
+        "spans": [],
+        "metrics": {"iterations": 0, "confidence": 0.0},
+    }
+
+
+def _problem_id(i: int, problem: dict) -> str:
+    return str(problem.get("id", str(i + 1)))
+
+
+def _record_result(
+    i: int, problem: dict, solution_data: dict, duration: float, evaluator: Evaluator
+) -> dict:
+    """Turns one flow result into a leaderboard row and prints live feedback."""
+    # 3. Evaluation (Adjudication)
+    is_solved = solution_data["status"] == "SOLVED"
+
+    metrics = {
+        "id": _problem_id(i, problem),
+        # Index in the unsharded dataset, so merged shards keep dataset order
+        "position": i,
+        "pass": is_solved,
+        "iterations": solution_data["metrics"]["iterations"],
+        "confidence": solution_data["metrics"]["confidence"],
+        "duration": round(duration, 2),
+        "cost_score": evaluator.calculate_efficiency_score(
+            is_solved, solution_data["metrics"]["iterations"]
+        ),
+        "prompt_tokens": solution_data["metrics"].get("prompt_tokens", 0),
+        "completion_tokens": solution_data["metrics"].get("completion_tokens", 0),
+        "cached_tokens": solution_data["metrics"].get("cached_tokens", 0),
+        "cost": solution_data["metrics"].get("cost", 0.0),
+        "spans": solution_data.get("spans", []),
+    }
+
+    # Live Feedback
+    icon = "✅" if is_solved else "❌"
+    print(
+        f"   {icon} Result: {solution_data['status']} | Iters: {metrics['iterations']} | Time: {metrics['duration']}s\n"
+    )
+    return metrics
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the AlphaKhulnasoft benchmark.")
+    parser.add_argument("dataset", nargs="?", default="data/hard_mode.jsonl")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--results", help="JSONL results file (default: results_<timestamp>.jsonl)")
+    parser.add_argument(
+        "--resume", action="store_true", help="Skip problems already in the results file"
+    )
+    parser.add_argument("--shard", help="Run only shard I of N, written as I/N")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Split the run across N local shard processes"
+    )
+    parser.add_argument(
+        "--model", default="gpt-4o", help="litellm model name, or fake/<script> to run offline"
+    )
+    args = parser.parse_args()
 
     # Check for API keys
-    if not os.getenv("OPENAI_API_KEY") and not os.getenv("ANTHROPIC_API_KEY"):
+    offline = args.model.startswith("fake/")
+    if not offline and not os.getenv("OPENAI_API_KEY") and not os.getenv("ANTHROPIC_API_KEY"):
         print("⚠️ Warning: No API keys found in environment. LLM calls will fail.")
 
-    # Handle dataset path from CLI
-    dataset = "data/hard_mode.jsonl" if len(sys.argv) < 2 else sys.argv[1]
+    if args.resume and not args.results:
+        parser.error("--resume needs --results pointing at the interrupted run's file")
+    if args.results and not args.resume and ResultSink(args.results).completed_ids():
+        parser.error(f"{args.results} already holds results; add --resume or pick a new file")
+
+    shard = None
+    if args.shard:
+        try:
+            index, count = (int(part) for part in args.shard.split("/"))
+        except ValueError:
+            parser.error(f"--shard must look like I/N, got {args.shard!r}")
+        if not 0 <= index < count:
+            parser.error(f"--shard {args.shard}: need 0 <= I < N")
+        shard = (index, count)
+
+    if args.workers > 1:
+        if shard is not None:
+            parser.error("--shard and --workers don't combine; --workers picks the shards itself")
+        if not args.results:
+            parser.error("--workers needs --results for the merged file")
+        run_sharded(
+            args.dataset if os.path.exists(args.dataset) else None,
+            args.workers,
+            args.results,
+            limit=args.limit,
+            resume=args.resume,
+            extra_args=["--concurrency", str(args.concurrency), "--model", args.model],
+        )
+        sys.exit(0)
 
-    if os.path.exists(dataset):
-        print(f"📊 Running benchmark on dataset: {dataset}")
-        run_benchmark(dataset_path=dataset, limit=10)
+    options = {
+        "concurrency": args.concurrency,
+        "results_path": args.results,
+        "resume": args.resume,
+        "shard": shard,
+        "model": args.model,
+    }
+    if os.path.exists(args.dataset):
+        print(f"📊 Running benchmark on dataset: {args.dataset}")
+        run_benchmark(dataset_path=args.dataset, limit=args.limit, **options)
     else:
-        print(f"⚠️ Dataset '{dataset}' not found.")
+        print(f"⚠️ Dataset '{args.dataset}' not found.")
         print("💡 Pro Tip: Run 'python3 -m alphakhulnasoft.dataset_gen' to create one.")
         print("   Falling back to Mock Problems for demonstration...\n")
-        run_benchmark(dataset_path=None, limit=2)
+        run_benchmark(dataset_path=None, limit=2, **options)
@@ -0,0 +1,131 @@
+import re
+import sys
+import tempfile
+from collections.abc import Callable
+
+# Step prompt fields that may be shortened to meet a cap. Code is never cut: the
+# debugger has to see all of it and the repair step has to return all of it.
+SHRINKABLE_FIELDS = ("error_log", "root_cause")
+MIN_FIELD_CHARS = 200
+
+# Sandbox source files show up in tracebacks as <tempdir>/tmpXXXX.py
+_CANDIDATE_FILE = re.compile(re.escape(tempfile.gettempdir()) + r"/tmp\w+\.py")
+_LIBRARY_PREFIXES = tuple({sys.prefix, sys.base_prefix, sys.exec_prefix})
+
+
+class PromptBudget:
+    """
+    Keeps each step's prompt under a token cap, measured with the model's
+    tokenizer (litellm's `token_counter`, falling back to ~4 chars per token).
+
+    Error logs are always compacted first: tracebacks keep only the last
+    `max_frames` frames outside the Python installation, candidate temp paths
+    become `solution.py`, and huge inputs/outputs are cut down to their ends.
+    If a prompt is still over `max_tokens` (an int for every step, or a
+    {step: cap} dict), its longest shrinkable field is halved from the middle
+    until it fits or nothing is left to shrink. The shared context blocks
+    (problem, analysis) are never cut: they are the prefix providers cache, and
+    cutting them differently per step would make every request a cache miss.
+    """
+
+    DEFAULT_MAX_TOKENS = 6000
+
+    def __init__(
+        self,
+        model: str,
+        max_tokens: int | dict[str, int] | None = DEFAULT_MAX_TOKENS,
+        max_frames: int = 3,
+        max_line_chars: int = 300,
+        max_section_lines: int = 30,
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_frames = max_frames
+        self.max_line_chars = max_line_chars
+        self.max_section_lines = max_section_lines
+
+    def fit(
+        self, step: str, render: Callable[..., str], context: list[str] | None = None, **fields: str
+    ) -> tuple[list[str], str]:
+        """
+        Renders `render(**fields)` for `step` and returns (context, prompt) with the
+        two together under the step's cap where the step fields allow it. Only the
+        prompt is shrunk; `context` comes back unchanged, so the cached prefix stays stable.
+        """
+        context = list(context or [])
+        if "error_log" in fields:
+            fields["error_log"] = self.compact_error_log(fields["error_log"])
+        prompt = render(**fields)
+
+        cap = self.max_tokens.get(step) if isinstance(self.max_tokens, dict) else self.max_tokens
+        while cap is not None and self._over("\n\n".join([*context, prompt]), cap):
+            shrinkable = [
+                name
+                for name in SHRINKABLE_FIELDS
+                if name in fields and len(fields[name]) > MIN_FIELD_CHARS
+            ]
+            if not shrinkable:
+                break
+            name = max(shrinkable, key=lambda n: len(fields[n]))
+            fields[name] = truncate_middle(fields[name], len(fields[name]) // 2)
+            prompt = render(**fields)
+        return context, prompt
+
+    def _over(self, prompt: str, cap: int) -> bool:
+        # Every token covers at least one byte, so short prompts need no tokenizer
+        return len(prompt.encode()) > cap and self.count(prompt) > cap
+
+    def count(self, text: str) -> int:
+        try:
+            from .llm import LLMProvider
+
+            return int(LLMProvider._litellm().token_counter(model=self.model, text=text))
+        except Exception:
+            return len(text) // 4
+
+    def compact_error_log(self, error_log: str) -> str:
+        error_log = _CANDIDATE_FILE.sub("solution.py", error_log)
+        sections = re.split(r"(?m)^(?=Test \d+ )", error_log)
+        return "".join(self._compact_section(section) for section in sections)
+
+    def _compact_section(self, section: str) -> str:
+        lines = self._trim_traceback(section.split("\n"))
+        lines = [truncate_middle(line, self.max_line_chars) for line in lines]
+        if len(lines) > self.max_section_lines:
+            head = self.max_section_lines * 2 // 3
+            tail = self.max_section_lines - head
+            omitted = len(lines) - head - tail
+            lines = [*lines[:head], f"   ... [{omitted} lines omitted] ...", *lines[-tail:]]
+        return "\n".join(lines)
+
+    def _trim_traceback(self, lines: list[str]) -> list[str]:
+        """Keeps the last `max_frames` frames that are not inside the Python installation."""
+        frames: list[list[str]] = []
+        before: list[str] = []
+        after: list[str] = []
+        for line in lines:
+            if line.startswith('  File "') and not after:
+                frames.append([line])
+            elif frames and line.startswith("    ") and not after:
+                frames[-1].append(line)
+            elif frames:
+                after.append(line)
+            else:
+                before.append(line)
+        if not frames:
+            return lines
+
+        relevant = [f for f in frames if not f[0][len('  File "') :].startswith(_LIBRARY_PREFIXES)]
+        kept = (relevant or frames)[-self.max_frames :]
+        omitted = len(frames) - len(kept)
+        marker = [f"  ... [{omitted} frames omitted] ..."] if omitted else []
+        return [*before, *marker, *(line for frame in kept for line in frame), *after]
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """Keeps the start and end of `text`, which is where inputs and errors say the most."""
+    if len(text) <= max_chars:
+        return text
+    keep = max(max_chars - 40, 0)
+    head, tail = text[: keep * 2 // 3], text[len(text) - keep // 3 :]
+    return f"{head} ...[{len(text) - len(head) - len(tail)} chars omitted]... {tail}"
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_code(code: str) -> str:
+    """
+    Canonical form used for hashing: only CRLF line endings are unified, which
+    Python reads the same way. Indentation and whitespace (inside string literals
+    too) change what a program does, so they are kept.
+    """
+    return code.replace("\r\n", "\n")
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode()).hexdigest()
+
+
+class ExecutionCache:
+    """
+    Content-addressed cache of sandbox execution results.
+    Keys are (code hash, test input, sandbox settings), values are the
+    raw `{"output", "error"}` dicts, so verdicts are still judged per test.
+
+    Lookups go through an in-memory LRU first, then an optional SQLite file that
+    persists across processes and benchmark reruns.
+    """
+
+    def __init__(self, max_entries: int = 10_000, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS executions "
+                "(key TEXT PRIMARY KEY, output TEXT NOT NULL, error TEXT)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(code_digest: str, input_str: str, scope: str) -> str:
+        """`scope` identifies the sandbox settings (timeout, limits) the result depends on."""
+        input_digest = hashlib.sha256(input_str.encode()).hexdigest()
+        return f"{code_digest}:{input_digest}:{scope}"
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT output, error FROM executions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    result = {"output": row[0], "error": row[1]}
+                    self._remember(key, result)
+
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._remember(key, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO executions (key, output, error) VALUES (?, ?, ?)",
+                    (key, result["output"], result["error"]),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, result: dict):
+        self._memory[key] = {"output": result["output"], "error": result["error"]}
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._memory),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class CacheMissError(LookupError):
+    """Raised in replay-only mode when a response was never recorded."""
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses keyed by (model, messages, request params).
+
+    - `ttl_seconds`: entries older than this are ignored and dropped (None = keep forever).
+    - `max_entries`: least recently used entries are evicted beyond this size.
+    - `replay_only`: never call the provider; a miss raises `CacheMissError`
+      (an `LLMError` once it reaches `LLMProvider` callers, so the flow fails).
+      Use it to run the pipeline offline against previously recorded responses.
+
+    Anything with the same `make_key`/`get`/`put` methods can be plugged into
+    `LLMProvider` instead.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        ttl_seconds: float | None = None,
+        max_entries: int | None = 100_000,
+        replay_only: bool = False,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: list[dict], **params) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params}, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            expired = (
+                row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds
+            )
+            if expired:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                if self.replay_only:
+                    raise CacheMissError(f"No recorded response for request {key[:12]}")
+                return None
+
+            self.hits += 1
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return str(row[0])
+
+    def put(self, key: str, response: str):
+        if self.replay_only:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if self.max_entries is not None:
+                (entries,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+                if entries > self.max_entries:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                        (entries - self.max_entries,),
+                    )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+        }
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,124 @@
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from collections.abc import Callable, Iterator
+from itertools import zip_longest
+
+# (input, expected, actual) -> accepted?
+Checker = Callable[[str, str, str], bool]
+
+_TOKEN = re.compile(r"\S+")
+_LINE = re.compile(r"[^\n]+")
+
+
+def exact(input_str: str, expected: str, actual: str) -> bool:
+    """Whole output equal after stripping surrounding whitespace (the default)."""
+    return actual.strip() == expected.strip()
+
+
+def tokens(input_str: str, expected: str, actual: str) -> bool:
+    """Same whitespace-separated tokens; spacing and line breaks are ignored."""
+    return all(e == a for e, a in zip_longest(_tokens(expected), _tokens(actual)))
+
+
+def float_tolerance(rel_tol: float = 1e-6, abs_tol: float = 1e-6) -> Checker:
+    """Token-wise, but numeric tokens only need to match within the tolerances."""
+
+    def check(input_str: str, expected: str, actual: str) -> bool:
+        for e, a in zip_longest(_tokens(expected), _tokens(actual)):
+            if e == a:
+                continue
+            if e is None or a is None:
+                return False
+            try:
+                if not math.isclose(float(e), float(a), rel_tol=rel_tol, abs_tol=abs_tol):
+                    return False
+            except ValueError:
+                return False
+        return True
+
+    return check
+
+
+def unordered_lines(input_str: str, expected: str, actual: str) -> bool:
+    """Same non-blank lines (each stripped) in any order."""
+    return Counter(_lines(expected)) == Counter(_lines(actual))
+
+
+class ScriptChecker:
+    """
+    Problem-specific checker script, testlib style:
+    `python <script> <input_file> <expected_file> <actual_file>`; exit code 0 accepts.
+    """
+
+    def __init__(self, path: str, timeout_seconds: float = 10):
+        self.path = path
+        self.timeout = timeout_seconds
+
+    def __call__(self, input_str: str, expected: str, actual: str) -> bool:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for name, content in (("input", input_str), ("expected", expected), ("actual", actual)):
+                path = os.path.join(tmp_dir, name)
+                with open(path, "w") as f:
+                    f.write(content)
+                paths.append(path)
+            try:
+                process = subprocess.run(
+                    [sys.executable, self.path, *paths],
+                    capture_output=True,
+                    timeout=self.timeout,
+                )
+            except subprocess.TimeoutExpired:
+                return False
+        return process.returncode == 0
+
+
+CHECKERS: dict[str, Checker] = {
+    "exact": exact,
+    "tokens": tokens,
+    "float": float_tolerance(),
+    "unordered": unordered_lines,
+}
+
+
+def get_checker(spec: str | Checker | None) -> Checker:
+    """
+    Resolves a problem's `checker` field: None or a name from `CHECKERS`,
+    "float:<tolerance>" (relative and absolute), a path to a checker script,
+    or any callable with the `Checker` signature.
+    Raises ValueError for a spec that cannot work (unknown name, bad tolerance,
+    missing script), rather than a checker that rejects every output.
+    """
+    if spec is None:
+        return exact
+    if callable(spec):
+        return spec
+    if spec in CHECKERS:
+        return CHECKERS[spec]
+    if spec.startswith("float:"):
+        try:
+            tolerance = float(spec.removeprefix("float:"))
+        except ValueError:
+            tolerance = math.nan
+        if not tolerance >= 0:
+            raise ValueError(f"Checker {spec!r}: tolerance must be a number >= 0")
+        return float_tolerance(tolerance, tolerance)
+    if spec.endswith(".py"):
+        if not os.path.isfile(spec):
+            raise ValueError(f"Checker script not found: {spec!r}")
+        return ScriptChecker(spec)
+    raise ValueError(f"Unknown checker: {spec!r}")
+
+
+def _tokens(text: str) -> Iterator[str]:
+    # Lazy, so large outputs are never split into a full token list
+    return (m.group() for m in _TOKEN.finditer(text))
+
+
+def _lines(text: str) -> Iterator[str]:
+    return (line for m in _LINE.finditer(text) if (line := m.group().strip()))
@@ -1,5 +1,8 @@
+import itertools
 import json
 import os
+from collections.abc import Callable, Collection, Iterable, Iterator
+from typing import Any
 
 
 class DataLoader:
@@ -8,48 +11,102 @@ class DataLoader:
     def __init__(self, dataset_name: str = "codecontests"):
         self.dataset_name = dataset_name
 
-    def load_problems(self, path: str) -> list[dict]:
-        """Loads problems from a local JSONL file."""
-        problems = []
+    def load_problems(
+        self,
+        path: str,
+        limit: int | None = None,
+        offset: int = 0,
+        shard: tuple[int, int] | None = None,
+        ids: Collection[str] | None = None,
+    ) -> Iterator[dict]:
+        """
+        Lazily yields problems from a local JSONL file.
+        `ids` filters, `offset`/`limit` pick a window, and `shard` (index, count)
+        takes one slice of that window. Lines outside the selection are never parsed.
+        """
         if not path or not os.path.exists(path):
             print(f"Warning: Path {path} does not exist or not provided.")
-            return []
+            return
 
+        wanted = {str(i) for i in ids} if ids is not None else None
         with open(path) as f:
-            for line in f:
-                problems.append(json.loads(line))
-        return problems
+            lines = (line for line in f if line.strip())
+            for line in self._select(lines, shard, limit, offset, wanted, self._line_matches):
+                yield json.loads(line)
 
-    def load_from_hf(self, dataset_name: str, split: str = "test") -> list[dict]:
+    def load_from_hf(
+        self,
+        dataset_name: str,
+        split: str = "test",
+        limit: int | None = None,
+        offset: int = 0,
+        shard: tuple[int, int] | None = None,
+        ids: Collection[str] | None = None,
+    ) -> Iterator[dict]:
         """
-        Loads a coding dataset from Hugging Face Hub.
-        Supports common formats like Humaneval.
+        Streams a coding dataset from Hugging Face Hub.
+        Supports common formats like Humaneval. Items are downloaded and converted
+        on demand, so `limit=10` does not materialize the whole split.
         """
         from datasets import load_dataset
 
         print(f"📥 Fetching dataset '{dataset_name}' [{split}] from Hugging Face...")
+        wanted = {str(i) for i in ids} if ids is not None else None
         try:
-            ds = load_dataset(dataset_name, split=split)
-            problems: list[dict] = []
-            for item in ds:
-                # Standardizing format: Humaneval/MBPP usually has 'prompt' or 'text'
-                problems.append(
-                    {
-                        "id": item.get("task_id") or item.get("id") or str(len(problems)),
-                        "title": item.get("entry_point") or "HF Problem",
-                        "description": item.get("prompt") or item.get("text") or "",
-                        "tests": self._parse_hf_tests(item),
-                    }
-                )
-            print(f"✅ Successfully loaded {len(problems)} problems from Hugging Face.")
-            return problems
+            ds = load_dataset(dataset_name, split=split, streaming=True)
+            problems = (self._convert_hf_item(n, item) for n, item in enumerate(ds))
+            count = 0
+            for problem in self._select(problems, shard, limit, offset, wanted, self._id_matches):
+                count += 1
+                yield problem
+            print(f"✅ Successfully loaded {count} problems from Hugging Face.")
         except Exception as e:
             print(f"❌ Error loading from HF: {e}")
-            print(
-                f"💡 Tip: For HumanEval, try 'openai_humaneval' instead of 'openai/humaneval'"
-            )
+            print("💡 Tip: For HumanEval, try 'openai_humaneval' instead of 'openai/humaneval'")
             print("   Or use the dataset generator: python -m alphakhulnasoft.dataset_gen")
-            return []
+
+    @staticmethod
+    def _select(
+        records: Iterable,
+        shard: tuple[int, int] | None,
+        limit: int | None,
+        offset: int,
+        wanted: set[str] | None,
+        matches: Callable[[Any, set[str]], bool],
+    ) -> Iterator:
+        """
+        Filter by ID, take the `offset`/`limit` window, then keep every `count`-th
+        record of that window starting at `index`, so n shards split exactly the
+        problems a single unsharded run would see.
+        """
+        if wanted is not None:
+            records = (r for r in records if matches(r, wanted))
+        stop = offset + limit if limit is not None else None
+        records = itertools.islice(records, offset, stop)
+        if shard is not None:
+            index, count = shard
+            records = (r for n, r in enumerate(records) if n % count == index)
+        return records
+
+    @staticmethod
+    def _line_matches(line: str, wanted: set[str]) -> bool:
+        # Cheap substring check first so non-matching lines are never parsed
+        if not any(problem_id in line for problem_id in wanted):
+            return False
+        return str(json.loads(line).get("id")) in wanted
+
+    @staticmethod
+    def _id_matches(problem: dict, wanted: set[str]) -> bool:
+        return str(problem["id"]) in wanted
+
+    def _convert_hf_item(self, index: int, item: dict) -> dict:
+        # Standardizing format: Humaneval/MBPP usually has 'prompt' or 'text'
+        return {
+            "id": item.get("task_id") or item.get("id") or str(index),
+            "title": item.get("entry_point") or "HF Problem",
+            "description": item.get("prompt") or item.get("text") or "",
+            "tests": self._parse_hf_tests(item),
+        }
 
     def _parse_hf_tests(self, item: dict) -> list[dict]:
         """Heuristic to extract tests from HF dataset items."""
@@ -1,3 +1,6 @@
+from .tracing import summarize_spans
+
+
 class Evaluator:
     """Calculates metrics for the AI Code Fixer."""
 
@@ -51,3 +54,27 @@ class Evaluator:
         print(f"AVG ITERATIONS: {total_iters / len(results) if results else 0:.2f}")
         print(f"TOTAL DURATION: {total_time:.2f}s")
         print("═" * 60 + "\n")
+        self.print_stage_breakdown(results)
+
+    def print_stage_breakdown(self, results: list[dict]):
+        """Prints where time, tokens and money went, per flow step, across all runs."""
+        stages = summarize_spans([s for res in results for s in res.get("spans", [])])
+        if not stages:
+            return
+        total_time = sum(stage["duration"] for stage in stages.values()) or 1.0
+
+        print("⏱️  STAGE BREAKDOWN")
+        print("─" * 86)
+        print(
+            f"{'Stage':<24} | {'Calls':<5} | {'Time':<8} | {'%':<5} | {'Tokens (in/out)':<15} | "
+            f"{'Cached':<7} | Cost"
+        )
+        print("─" * 86)
+        for name, stage in sorted(stages.items(), key=lambda kv: -kv[1]["duration"]):
+            tokens = f"{stage['prompt_tokens']}/{stage['completion_tokens']}"
+            share = stage["duration"] / total_time
+            print(
+                f"{name:<24} | {stage['calls']:<5} | {stage['duration']:<8.2f} | {share:<5.0%} | "
+                f"{tokens:<15} | {stage['cached_tokens']:<7} | ${stage['cost']:.4f}"
+            )
+        print("═" * 86 + "\n")
@@ -0,0 +1,250 @@
+"""
+Offline stand-in for litellm, used by `LLMProvider` for `fake/...` models.
+
+A fake model name is `fake/<script>` plus optional query-string knobs, e.g.
+`fake/repair?latency=0.3&error_rate=0.05&burst_every=40`:
+
+- script: `solve` answers the mock problems correctly, `repair` writes a buggy
+  solution first and fixes it once a root cause comes back, `fail` never gets
+  it right. Register more with `register_script`.
+- latency (median seconds), latency_sigma (log-normal spread), slow_rate and
+  slow_factor (share of calls that take `slow_factor` times longer, the tail
+  hedging is meant to cut)
+- error_rate: share of calls failing with a 503
+- burst_every / burst_length: every `burst_every`-th call starts a run of
+  `burst_length` 429s, answered with a `retry_after` header
+- seed: makes latencies and errors reproducible
+
+Fakes are shared per model name, so every provider of a run sees the same call
+counter (and therefore the same 429 bursts).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, fields
+from types import SimpleNamespace
+from urllib.parse import parse_qsl
+
+FAKE_PREFIX = "fake/"
+
+# (problem text -> correct code, buggy code) for the mock problems
+MOCK_SOLUTIONS: dict[str, tuple[str, str]] = {
+    "double an integer": (
+        "n = int(input())\nprint(max(n, 0) * 2)",
+        "n = int(input())\nprint(n * 2)",
+    ),
+    "sum of all even numbers": (
+        "import ast\nprint(sum(x for x in ast.literal_eval(input()) if x % 2 == 0))",
+        "import ast\nprint(sum(ast.literal_eval(input())))",
+    ),
+}
+UNKNOWN_PROBLEM_CODE = "import sys\nprint(sys.stdin.read().strip())"
+
+# step -> a phrase only that step's prompt contains
+_STEP_MARKERS = {
+    "semantic_analysis": "Systems Architect",
+    "generate_solution": "10x Python Developer",
+    "analyze_failure": "Debugging Agent",
+    "targeted_repair": "Maintenance Engineer",
+}
+
+# (step, problem text) -> response text
+Script = Callable[[str, str], str]
+
+
+class FakeProviderError(Exception):
+    """Injected provider failure; carries the HTTP status like litellm's exceptions."""
+
+    def __init__(self, status_code: int, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def _mock_code(problem: str, correct: bool) -> str:
+    for phrase, (good, bad) in MOCK_SOLUTIONS.items():
+        if phrase in problem.lower():
+            return good if correct else bad
+    return UNKNOWN_PROBLEM_CODE
+
+
+def _script(first_try_correct: bool, repair_correct: bool) -> Script:
+    def answer(step: str, problem: str) -> str:
+        if step == "semantic_analysis":
+            return "- Algo: Implementation\n- Constraints: small\n- Edge Cases: negatives, empty"
+        if step == "analyze_failure":
+            return "ROOT CAUSE: The solution mishandles an edge case.\nCheck the failing input."
+        correct = repair_correct if step == "targeted_repair" else first_try_correct
+        return f"```python\n{_mock_code(problem, correct)}\n```\nThis reads stdin and prints."
+
+    return answer
+
+
+SCRIPTS: dict[str, Script] = {
+    "solve": _script(first_try_correct=True, repair_correct=True),
+    "repair": _script(first_try_correct=False, repair_correct=True),
+    "fail": _script(first_try_correct=False, repair_correct=False),
+}
+
+
+def register_script(name: str, script: Script):
+    """Makes `fake/<name>` answer with `script(step, problem_text)`."""
+    SCRIPTS[name] = script
+
+
+@dataclass
+class FakeSettings:
+    latency: float = 0.0
+    latency_sigma: float = 0.5
+    slow_rate: float = 0.0
+    slow_factor: float = 10.0
+    error_rate: float = 0.0
+    burst_every: int = 0
+    burst_length: int = 3
+    retry_after: float = 0.1
+    seed: int | None = None
+
+
+class FakeLLM:
+    """Implements the slice of the litellm API `LLMProvider` uses."""
+
+    def __init__(self, script: Script, settings: FakeSettings | None = None):
+        self.script = script
+        self.settings = settings or FakeSettings()
+        self.calls = 0
+        self._random = random.Random(self.settings.seed)
+        self._burst_left = 0
+        self._lock = threading.Lock()
+
+    # --- litellm surface ---
+
+    def completion(self, model: str, messages: list[dict], stream: bool = False, **params):
+        delay, error = self._draw(params.get("timeout"))
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        text = self._answer(messages)
+        return self._chunks(text) if stream else _response(text, messages)
+
+    async def acompletion(self, model: str, messages: list[dict], stream: bool = False, **params):
+        delay, error = self._draw(params.get("timeout"))
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        text = self._answer(messages)
+        return _AsyncChunks(self._chunks(text)) if stream else _response(text, messages)
+
+    @staticmethod
+    def stream_chunk_builder(chunks: list, messages: list[dict] | None = None):
+        text = "".join(chunk.choices[0].delta.content for chunk in chunks)
+        return _response(text, messages or [])
+
+    @staticmethod
+    def completion_cost(completion_response=None, **kwargs) -> float:
+        return 0.0
+
+    # --- behaviour ---
+
+    def _draw(self, timeout: float | None) -> tuple[float, Exception | None]:
+        """Latency of the next call and the error it ends with, if any."""
+        s = self.settings
+        with self._lock:
+            self.calls += 1
+            if s.burst_every and self.calls % s.burst_every == 0:
+                self._burst_left = s.burst_length
+            in_burst = self._burst_left > 0
+            self._burst_left = max(self._burst_left - 1, 0)
+            delay = s.latency * self._random.lognormvariate(0, s.latency_sigma) if s.latency else 0
+            if self._random.random() < s.slow_rate:
+                delay *= s.slow_factor
+            failed = self._random.random() < s.error_rate
+
+        if in_burst:
+            return 0.0, FakeProviderError(429, "Rate limit exceeded (fake)", s.retry_after)
+        if timeout is not None and delay > timeout:
+            return timeout, TimeoutError(f"Fake call took longer than {timeout}s")
+        if failed:
+            return delay, FakeProviderError(503, "Service unavailable (fake)")
+        return delay, None
+
+    def _answer(self, messages: list[dict]) -> str:
+        blocks = _message_blocks(messages)
+        text = "\n\n".join(blocks)
+        step = next((s for s, marker in _STEP_MARKERS.items() if marker in text), "")
+        problem = next((b for b in blocks if b.startswith("PROBLEM:")), text)
+        return self.script(step, problem)
+
+    @staticmethod
+    def _chunks(text: str, size: int = 16) -> Iterator:
+        for i in range(0, len(text), size):
+            delta = SimpleNamespace(content=text[i : i + size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+_fakes: dict[str, FakeLLM] = {}
+_fakes_lock = threading.Lock()
+
+
+def get_fake(model: str) -> FakeLLM:
+    """The shared `FakeLLM` for a `fake/<script>?<settings>` model name."""
+    with _fakes_lock:
+        if model not in _fakes:
+            name, _, query = model.removeprefix(FAKE_PREFIX).partition("?")
+            if name not in SCRIPTS:
+                raise ValueError(f"Unknown fake script {name!r}; known: {sorted(SCRIPTS)}")
+            _fakes[model] = FakeLLM(SCRIPTS[name], _parse_settings(query))
+        return _fakes[model]
+
+
+def _parse_settings(query: str) -> FakeSettings:
+    types = {f.name: f.type for f in fields(FakeSettings)}
+    values: dict = {}
+    for key, value in parse_qsl(query, strict_parsing=bool(query)):
+        if key not in types:
+            raise ValueError(f"Unknown fake model setting {key!r}")
+        values[key] = int(value) if types[key] in (int, int | None) else float(value)
+    return FakeSettings(**values)
+
+
+def _message_blocks(messages: list[dict]) -> list[str]:
+    blocks: list[str] = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            blocks.extend(block["text"] for block in content)
+        else:
+            blocks.append(content)
+    return blocks
+
+
+def _response(text: str, messages: list[dict]):
+    usage = SimpleNamespace(
+        prompt_tokens=sum(len(block) for block in _message_blocks(messages)) // 4,
+        completion_tokens=len(text) // 4,
+    )
+    usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+    message = SimpleNamespace(content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class _AsyncChunks:
+    """Async iterator over a chunk generator, like litellm's async stream wrapper."""
+
+    def __init__(self, chunks: Iterator):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def aclose(self):
+        pass
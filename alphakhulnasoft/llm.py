@@ -1,7 +1,96 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
 from dotenv import load_dotenv
 
+from .cache import CacheMissError, ResponseCache
+from .tracing import record_llm_usage
+
 load_dotenv()
 
+# Statuses worth another attempt: timeouts, conflicts, rate limits and any 5xx
+RETRYABLE_STATUS = frozenset({408, 409, 429})
+# Hedging starts once this many latencies of a model have been seen
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Recent successful call latencies per model, shared by every provider in the process
+_latencies: dict[str, deque[float]] = {}
+
+
+class LLMError(RuntimeError):
+    """A completion failed for good: a non-retryable error, or retries ran out."""
+
+
+class RateLimiter:
+    """
+    Sliding-window limit on requests and tokens per minute for one provider.
+    Shared by every `LLMProvider` that talks to that provider, sync or async
+    (threads and event loops may share one limiter).
+    Token counts are estimated before the call and corrected from `usage` after it.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(
+        self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events: deque[list[float]] = deque()  # [timestamp, tokens]
+        self._lock = threading.Lock()
+
+    async def acquire(self, tokens: int) -> list[float]:
+        """Waits until the request fits in the window and returns its ledger entry."""
+        while True:
+            entry, wait_seconds = self._try_acquire(tokens)
+            if entry is not None:
+                return entry
+            await asyncio.sleep(wait_seconds)
+
+    def acquire_blocking(self, tokens: int) -> list[float]:
+        """`acquire` for sync callers: sleeps the calling thread instead."""
+        while True:
+            entry, wait_seconds = self._try_acquire(tokens)
+            if entry is not None:
+                return entry
+            time.sleep(wait_seconds)
+
+    def _try_acquire(self, tokens: int) -> tuple[list[float] | None, float]:
+        """(ledger entry, 0) if the request fits now, else (None, seconds until it may)."""
+        with self._lock:
+            now = time.monotonic()
+            while self._events and now - self._events[0][0] >= self.WINDOW_SECONDS:
+                self._events.popleft()
+
+            used_tokens = sum(event[1] for event in self._events)
+            requests_ok = (
+                self.requests_per_minute is None or len(self._events) < self.requests_per_minute
+            )
+            # A single oversized request is let through once the window is empty
+            tokens_ok = (
+                self.tokens_per_minute is None
+                or not self._events
+                or used_tokens + tokens <= self.tokens_per_minute
+            )
+            if requests_ok and tokens_ok:
+                entry = [now, float(tokens)]
+                self._events.append(entry)
+                return entry, 0.0
+            return None, self._events[0][0] + self.WINDOW_SECONDS - now
+
+    @staticmethod
+    def record(entry: list[float], tokens: int):
+        """Replaces the estimate in a ledger entry with the real token usage."""
+        entry[1] = float(tokens)
+
 
 class LLMProvider:
     """
@@ -9,34 +98,451 @@ class LLMProvider:
     Supports OpenAI, Anthropic, Hugging Face, and Vertex AI.
 
     Vertex AI Example: model="vertex_ai/gemini-1.5-pro"
+    Offline: model="fake/<script>?<settings>" (see `fake_llm.FakeLLM`).
     """
 
-    def __init__(self, model: str = "gpt-4-turbo"):
+    def __init__(
+        self,
+        model: str = "gpt-4-turbo",
+        cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        timeout: float | None = 120.0,
+        max_attempts: int = 4,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 30.0,
+        hedge_quantile: float | None = None,
+    ):
+        """
+        - `cache`: a `ResponseCache` answering repeated requests without a call.
+        - `rate_limiter`: shared by `complete` and `acomplete`, retries included.
+        - `timeout`: seconds per request.
+        - `max_attempts`: tries in total; timeouts, 429s and 5xx are retried after a
+          full-jitter exponential backoff (or Retry-After), then `LLMError` is raised.
+        - `hedge_quantile`: e.g. 0.95 duplicates a call that outlives that quantile
+          of the model's recent latencies; the first answer wins.
+        """
         self.model = model
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge_quantile = hedge_quantile
+
+    def complete(
+        self,
+        prompt: str,
+        system_prompt: str | None = None,
+        temperature: float | None = None,
+        sample: int = 0,
+        context: list[str] | None = None,
+        stop_at_code: bool = False,
+    ) -> str:
+        """
+        Sends a completion request to the LLM.
+        `sample` numbers independent draws of the same request (best-of-N search)
+        so each one gets its own response cache entry.
+        `context` blocks go ahead of the prompt as a prefix kept identical across
+        a flow, so providers can cache it (Anthropic gets `cache_control` marks).
+        `stop_at_code` streams the answer and hangs up once its python block closes.
+        Raises `LLMError` when no answer could be obtained.
+        """
+        messages = self._build_messages(prompt, system_prompt, context)
+        params = {"temperature": temperature} if temperature is not None else {}
+        cache_key, cached = self._cache_lookup(messages, params, sample)
+        if cached is not None:
+            return cached
+
+        estimate = _estimate_tokens(prompt, system_prompt, context)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self._hedged(
+                    lambda: self._call(messages, params, stop_at_code, estimate)
+                )
+                break
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt))
+        return self._handle_response(response, cache_key)
+
+    async def acomplete(
+        self,
+        prompt: str,
+        system_prompt: str | None = None,
+        temperature: float | None = None,
+        sample: int = 0,
+        context: list[str] | None = None,
+        stop_at_code: bool = False,
+    ) -> str:
+        """Async version of `complete`."""
+        messages = self._build_messages(prompt, system_prompt, context)
+        params = {"temperature": temperature} if temperature is not None else {}
+        cache_key, cached = self._cache_lookup(messages, params, sample)
+        if cached is not None:
+            return cached
+
+        estimate = _estimate_tokens(prompt, system_prompt, context)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = await self._ahedged(
+                    lambda: self._acall(messages, params, stop_at_code, estimate)
+                )
+                break
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+        return self._handle_response(response, cache_key)
+
+    def _call(self, messages: list[dict], params: dict, stop_at_code: bool, estimated_tokens: int):
+        """
+        One request to the provider; returns litellm's response object.
+        Every request (retries and hedges too) goes through the rate limiter.
+        """
+        litellm = self._client()
+        entry = None
+        if self.rate_limiter is not None:
+            entry = self.rate_limiter.acquire_blocking(estimated_tokens)
+        start = time.monotonic()
+        if stop_at_code:
+            stream = litellm.completion(
+                model=self.model, messages=messages, stream=True, **self._options(params)
+            )
+            fence = _FenceTracker()
+            chunks = []
+            try:
+                for chunk in stream:
+                    chunks.append(chunk)
+                    if fence.feed(_delta(chunk)):
+                        break
+            finally:
+                _close_stream(stream)
+            response = self._stream_response(chunks, fence.text, messages)
+        else:
+            response = litellm.completion(
+                model=self.model, messages=messages, **self._options(params)
+            )
+        self._record_latency(time.monotonic() - start)
+        if entry is not None and getattr(response, "usage", None):
+            RateLimiter.record(entry, response.usage.total_tokens)
+        return response
+
+    async def _acall(
+        self,
+        messages: list[dict],
+        params: dict,
+        stop_at_code: bool,
+        estimated_tokens: int,
+    ):
+        """Async `_call`; every request (retries and hedges too) goes through the rate limiter."""
+        litellm = self._client()
+        entry = None
+        if self.rate_limiter is not None:
+            entry = await self.rate_limiter.acquire(estimated_tokens)
+        start = time.monotonic()
+        if stop_at_code:
+            stream = await litellm.acompletion(
+                model=self.model, messages=messages, stream=True, **self._options(params)
+            )
+            fence = _FenceTracker()
+            chunks = []
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    if fence.feed(_delta(chunk)):
+                        break
+            finally:
+                await _aclose_stream(stream)
+            response = self._stream_response(chunks, fence.text, messages)
+        else:
+            response = await litellm.acompletion(
+                model=self.model, messages=messages, **self._options(params)
+            )
+        self._record_latency(time.monotonic() - start)
+        if entry is not None and getattr(response, "usage", None):
+            RateLimiter.record(entry, response.usage.total_tokens)
+        return response
+
+    def _options(self, params: dict) -> dict:
+        return {**params, "timeout": self.timeout} if self.timeout is not None else params
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before attempt `attempt + 1`; raises `LLMError` when there is none."""
+        if not _is_retryable(error) or attempt >= self.max_attempts:
+            raise LLMError(
+                f"{self.model} call failed after {attempt} attempt(s): {error}"
+            ) from error
+        cap = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempt - 1))
+        delay = max(random.uniform(0, cap), _retry_after(error) or 0.0)
+        print(
+            f"⏳ [LLM] {type(error).__name__} from {self.model}, "
+            f"retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s"
+        )
+        return delay
+
+    def _hedge_after(self) -> float | None:
+        """Latency (seconds) past which a duplicate request is sent, once enough are known."""
+        latencies = _latencies.get(self.model)
+        if self.hedge_quantile is None or latencies is None or len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(int(len(ordered) * self.hedge_quantile), len(ordered) - 1)]
+
+    def _record_latency(self, seconds: float):
+        _latencies.setdefault(self.model, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def _hedged(self, call: Callable[[], object]):
+        threshold = self._hedge_after()
+        if threshold is None:
+            return call()
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            first = executor.submit(call)
+            done, _ = wait([first], timeout=threshold)
+            if done:
+                return first.result()
+            print(f"🪞 [LLM] No answer after {threshold:.1f}s, hedging with a duplicate request")
+            return _first_success({first, executor.submit(call)})
+        finally:
+            # A sync request cannot be interrupted; the slower one finishes unobserved
+            executor.shutdown(wait=False)
+
+    async def _ahedged(self, call: Callable[[], Awaitable]):
+        threshold = self._hedge_after()
+        if threshold is None:
+            return await call()
+
+        tasks = {asyncio.ensure_future(call())}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if not done:
+                print(
+                    f"🪞 [LLM] No answer after {threshold:.1f}s, hedging with a duplicate request"
+                )
+                tasks.add(asyncio.ensure_future(call()))
+            error: BaseException | None = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _build_messages(
+        self, prompt: str, system_prompt: str | None, context: list[str] | None = None
+    ) -> list[dict]:
+        messages: list[dict] = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        if not context:
+            messages.append({"role": "user", "content": prompt})
+            return messages
 
-    def complete(self, prompt: str, system_prompt: str | None = None) -> str:
-        """Sends a completion request to the LLM."""
+        blocks: list[dict] = []
+        for text in context:
+            block: dict = {"type": "text", "text": text}
+            if self._supports_cache_control():
+                # Each breakpoint caches everything up to and including its block
+                block["cache_control"] = {"type": "ephemeral"}
+            blocks.append(block)
+        blocks.append({"type": "text", "text": prompt})
+        messages.append({"role": "user", "content": blocks})
+        return messages
+
+    def _supports_cache_control(self) -> bool:
+        """Anthropic models (direct, Bedrock or Vertex AI) take explicit cache breakpoints."""
+        model = self.model.lower()
+        return "claude" in model or model.startswith("anthropic/")
+
+    def _cache_lookup(
+        self, messages: list[dict], params: dict, sample: int
+    ) -> tuple[str | None, str | None]:
+        """
+        Returns (cache_key, cached_response); both None without a cache.
+        A replay-only miss is an `LLMError`, so the flow fails instead of crashing.
+        """
+        if self.cache is None:
+            return None, None
+        key_params = {**params, "sample": sample} if sample else params
+        cache_key = self.cache.make_key(self.model, messages, **key_params)
+        try:
+            return cache_key, self.cache.get(cache_key)
+        except CacheMissError as e:
+            raise LLMError(f"{self.model}: {e}") from e
+
+    def _handle_response(self, response, cache_key: str | None) -> str:
+        content = str(response.choices[0].message.content)
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+            record_llm_usage(
+                prompt_tokens, completion_tokens, self._cost(response), _cached_tokens(usage)
+            )
+        if self.cache is not None and cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    def _stream_response(self, chunks: list, content: str, messages: list[dict]):
+        """
+        Response object for a (possibly cut short) stream. litellm rebuilds usage
+        from the chunks, counting tokens itself when the stream ended early.
+        """
+        try:
+            response = self._client().stream_chunk_builder(chunks, messages=messages)
+            response.choices[0].message.content = content
+            return response
+        except Exception:
+            # Usage unknown; the content is all the caller needs
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    def _cost(self, response) -> float:
+        try:
+            return float(self._client().completion_cost(completion_response=response))
+        except Exception:
+            # Unknown or self-hosted models have no price entry
+            return 0.0
+
+    def _client(self):
+        """litellm, or the offline `FakeLLM` for `fake/...` models (see `fake_llm`)."""
+        if self.model.startswith("fake/"):
+            from .fake_llm import get_fake
+
+            return get_fake(self.model)
+        return self._litellm()
+
+    @staticmethod
+    def _litellm():
+        # Use the bundled model cost map instead of fetching it over the network on import
+        os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
         import litellm
 
         # Disable telemetry and version checks to prevent hangs
         litellm.telemetry = False
         litellm.version_check = False
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        # One pooled client for every sync call, so connections are kept alive between
+        # requests (async clients are cached by litellm itself, per event loop)
+        if litellm.client_session is None:
+            import httpx
 
-        try:
-            response = litellm.completion(model=self.model, messages=messages)
-            return str(response.choices[0].message.content)
-        except Exception as e:
-            print(f"Error calling LLM: {e}")
-            return str(f"Error: {e}")
+            litellm.client_session = httpx.Client(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        return litellm
 
     def extract_code(self, text: str) -> str:
         """Heuristic to extract code from markdown backticks."""
         if "```python" in text:
             return text.split("```python")[1].split("```")[0].strip()
+        elif "```py\n" in text:
+            return text.split("```py\n")[1].split("```")[0].strip()
         elif "```" in text:
             return text.split("```")[1].split("```")[0].strip()
         return text.strip()
+
+
+def _estimate_tokens(prompt: str, system_prompt: str | None, context: list[str] | None) -> int:
+    """Rough token count (~4 chars each) the rate limiter books before a call."""
+    texts = [prompt, system_prompt or "", *(context or [])]
+    return sum(len(text) for text in texts) // 4
+
+
+def _first_success(futures: set[Future]):
+    """Result of whichever future succeeds first; the last error if all of them fail."""
+    error: BaseException | None = None
+    pending = futures
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    assert error is not None
+    raise error
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # litellm maps provider errors to exceptions carrying the HTTP status
+    # (its Timeout is 408, APIConnectionError 500)
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in RETRYABLE_STATUS or status >= 500)
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt cache (OpenAI / Anthropic usage shapes)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", 0)
+    return cached if isinstance(cached, int) else 0
+
+
+class _FenceTracker:
+    """Accumulates streamed text and spots the end of the block `extract_code` will pick."""
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0  # where the next fence search starts
+        self._label: str | None = None  # info string of the open block, None outside one
+        self._blocks = 0  # blocks closed so far
+
+    def feed(self, delta: str) -> bool:
+        """Adds a chunk; True (with `text` cut after the closing fence) once that block is done."""
+        self.text += delta
+        while True:
+            fence = self.text.find("```", self._pos)
+            if fence < 0:
+                self._pos = max(len(self.text) - 2, self._pos)  # a fence may straddle two chunks
+                return False
+            if self._label is None:
+                newline = self.text.find("\n", fence)
+                if newline < 0:
+                    self._pos = fence  # the info string is still streaming
+                    return False
+                self._label = self.text[fence + 3 : newline].strip().lower()
+                self._pos = newline + 1
+                continue
+            # A python block always wins; an unlabeled one only when it's the first block
+            if _is_python_label(self._label) or (not self._label and not self._blocks):
+                self.text = self.text[: fence + 3]
+                return True
+            self._label = None
+            self._blocks += 1
+            self._pos = fence + 3
+
+
+def _is_python_label(label: str) -> bool:
+    return label.startswith("python") or label == "py"
+
+
+def _delta(chunk) -> str:
+    try:
+        return chunk.choices[0].delta.content or ""
+    except (AttributeError, IndexError):
+        return ""
+
+
+def _close_stream(stream):
+    close = getattr(stream, "close", None)
+    if callable(close):
+        close()
+
+
+async def _aclose_stream(stream):
+    aclose = getattr(stream, "aclose", None)
+    if callable(aclose):
+        await aclose()
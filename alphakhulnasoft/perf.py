@@ -0,0 +1,277 @@
+"""
+Self-benchmarks for the framework's own hot paths, as opposed to `benchmark`,
+which measures how well the agent solves problems.
+
+    python -m alphakhulnasoft.perf --output perf.json
+    python -m alphakhulnasoft.perf --baseline perf.json --tolerance 0.2
+
+Every measurement is the best of a few repeats, so one scheduling hiccup does
+not count as a regression. Results are written as JSON ({"meta": ...,
+"results": {name: {"value", "unit", "higher_is_better"}}}); with `--baseline`
+each result is compared to the same name in an earlier file, and the command
+exits with status 1 if any of them got worse by more than `--tolerance`.
+"""
+
+import contextlib
+import datetime
+import functools
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+
+from .alpha_repair import AlphaRepairAgent
+from .data_loader import DataLoader
+from .llm import LLMProvider
+from .sandbox import Sandbox, WarmSandbox
+
+SUITES = ("sandbox", "overhead", "extract_code", "loader", "flow")
+
+SMALL_CODE = "n = int(input())\nprint(n * 2)\n"
+# Same behaviour, plus ~1000 lines of helpers the run has to load
+LARGE_CODE = (
+    "".join(f"def helper_{i}(x):\n    return x + {i}\n\n\n" for i in range(250)) + SMALL_CODE
+)
+
+
+@dataclass
+class Measurement:
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+
+
+def best_time(fn: Callable[[], object], repeat: int = 3) -> float:
+    """Fastest of `repeat` wall-clock timings of `fn()`, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_sandbox(quick: bool = False) -> list[Measurement]:
+    """Tests per second by sandbox flavour, test count and code size."""
+    counts = (10,) if quick else (10, 100)
+    results = []
+    for kind in ("cold", "warm", "batch"):
+        if kind == "cold":
+            sandbox: Sandbox = Sandbox(timeout_seconds=2)
+        else:
+            sandbox = WarmSandbox(timeout_seconds=2, batch_tests=kind == "batch")
+        try:
+            for count in counts:
+                tests = [{"input": str(i), "expected": str(i * 2)} for i in range(count)]
+                for size, code in (("small", SMALL_CODE), ("large", LARGE_CODE)):
+                    seconds = best_time(functools.partial(sandbox.run_tests, code, tests))
+                    results.append(
+                        Measurement(
+                            f"sandbox.{kind}.tests={count}.code={size}", count / seconds, "tests/s"
+                        )
+                    )
+        finally:
+            if isinstance(sandbox, WarmSandbox):
+                sandbox.close()
+    return results
+
+
+def bench_overhead(quick: bool = False) -> list[Measurement]:
+    """What `run_tests` adds on top of running the same code with a bare `python -c`."""
+    repeat = 5 if quick else 15
+    test = [{"input": "21", "expected": "42"}]
+    sandbox = Sandbox(timeout_seconds=2)
+
+    def bare():
+        subprocess.run(
+            [sys.executable, "-c", SMALL_CODE], input=b"21", capture_output=True, check=True
+        )
+
+    bare_seconds = best_time(bare, repeat)
+    sandbox_seconds = best_time(lambda: sandbox.run_tests(SMALL_CODE, test), repeat)
+    return [
+        Measurement("overhead.python_c.ms", bare_seconds * 1000, "ms", higher_is_better=False),
+        Measurement("overhead.run_tests.ms", sandbox_seconds * 1000, "ms", higher_is_better=False),
+        Measurement(
+            "overhead.run_tests.ratio", sandbox_seconds / bare_seconds, "x", higher_is_better=False
+        ),
+    ]
+
+
+def bench_extract_code(quick: bool = False) -> list[Measurement]:
+    """`extract_code` throughput on a long, chatty response around a large code block."""
+    prose = "The approach relies on a monotonic stack. " * 5000
+    response = f"{prose}\n```python\n{LARGE_CODE * 10}```\n{prose}"
+    llm = LLMProvider(model="fake/solve")
+    rounds = 20 if quick else 200
+
+    def run():
+        for _ in range(rounds):
+            llm.extract_code(response)
+
+    seconds = best_time(run)
+    megabytes = len(response.encode()) * rounds / 1e6
+    return [Measurement("extract_code.large_response", megabytes / seconds, "MB/s")]
+
+
+def bench_loader(quick: bool = False) -> list[Measurement]:
+    """`DataLoader.load_problems` on a large JSONL file, in full and filtered by ID."""
+    count = 5_000 if quick else 50_000
+    loader = DataLoader()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "problems.jsonl")
+        with open(path, "w") as f:
+            for i in range(count):
+                problem = {
+                    "id": f"p{i}",
+                    "title": f"Problem {i}",
+                    "description": "Given n integers, print their sum. " * 15,
+                    "tests": [{"input": f"{j}\n", "expected": f"{j}"} for j in range(10)],
+                }
+                f.write(json.dumps(problem) + "\n")
+
+        wanted = [f"p{i}" for i in range(0, count, count // 10)]
+        full = best_time(lambda: sum(1 for _ in loader.load_problems(path)))
+        filtered = best_time(lambda: sum(1 for _ in loader.load_problems(path, ids=wanted)))
+    return [
+        Measurement("loader.full_scan", count / full, "problems/s"),
+        Measurement("loader.id_filter", count / filtered, "lines/s"),
+    ]
+
+
+def bench_flow(quick: bool = False) -> list[Measurement]:
+    """Orchestration cost of a whole flow (analysis, a failed try, a repair) with a zero-latency LLM."""
+    problem = DataLoader().get_mock_problem()
+    repeat = 3 if quick else 10
+    with WarmSandbox(timeout_seconds=2) as sandbox:
+        agent = AlphaRepairAgent(model_name="fake/repair", sandbox=sandbox)
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = agent.run_flow(problem["description"], tests=problem["tests"])
+            assert result["status"] == "SOLVED"
+
+        seconds = best_time(run, repeat)
+    return [Measurement("flow.fake_repair.ms", seconds * 1000, "ms", higher_is_better=False)]
+
+
+_BENCHMARKS: dict[str, Callable[[bool], list[Measurement]]] = {
+    "sandbox": bench_sandbox,
+    "overhead": bench_overhead,
+    "extract_code": bench_extract_code,
+    "loader": bench_loader,
+    "flow": bench_flow,
+}
+
+
+def run_suite(quick: bool = False, only: list[str] | None = None) -> dict:
+    """Runs the selected suites (all by default) and returns the JSON report."""
+    results = {}
+    for suite in only or SUITES:
+        print(f"⏱️  Benchmarking {suite}...")
+        for measurement in _BENCHMARKS[suite](quick):
+            results[measurement.name] = {
+                key: value for key, value in asdict(measurement).items() if key != "name"
+            }
+    return {"meta": _meta(quick), "results": results}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> list[dict]:
+    """
+    One row per result present in both reports: {"name", "baseline", "current",
+    "change", "regressed"}. `change` is the relative change in the good direction,
+    so a negative value is always a slowdown.
+    """
+    rows = []
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None or not before["value"]:
+            continue
+        change = now["value"] / before["value"] - 1
+        if not now["higher_is_better"]:
+            change = before["value"] / now["value"] - 1 if now["value"] else float("inf")
+        rows.append(
+            {
+                "name": name,
+                "baseline": before["value"],
+                "current": now["value"],
+                "change": change,
+                "regressed": change < -tolerance,
+            }
+        )
+    return rows
+
+
+def print_report(report: dict, rows: list[dict] | None = None):
+    compared = {row["name"]: row for row in rows or []}
+    print("\n" + "═" * 86)
+    print(f"{'Benchmark':<42} | {'Value':>12} {'Unit':<10} | {'vs baseline':>12}")
+    print("─" * 86)
+    for name, result in report["results"].items():
+        row = compared.get(name)
+        versus = ""
+        if row is not None:
+            versus = f"{row['change']:+.0%}" + (" ❌" if row["regressed"] else "")
+        print(f"{name:<42} | {result['value']:>12.2f} {result['unit']:<10} | {versus:>12}")
+    print("═" * 86 + "\n")
+
+
+def _meta(quick: bool) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": quick,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark AlphaKhulnasoft's own hot paths.")
+    parser.add_argument("--output", default="perf.json", help="Where to write the JSON report")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%)"
+    )
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs, fewer repeats")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(SUITES)}")
+    args = parser.parse_args()
+
+    only = args.only.split(",") if args.only else None
+    unknown = set(only or ()) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+    report = run_suite(quick=args.quick, only=only)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    rows = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(report, json.load(f), args.tolerance)
+    print_report(report, rows)
+    print(f"💾 Results saved to {args.output}")
+
+    regressed = [row["name"] for row in rows or [] if row["regressed"]]
+    if regressed:
+        print(
+            f"⚠️ {len(regressed)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressed)}"
+        )
+        sys.exit(1)
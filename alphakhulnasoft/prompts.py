@@ -2,17 +2,35 @@ class PromptRegistry:
     """
     Central repository for Flow Engineering prompts.
     Separates logic (Python) from reasoning (English).
+
+    Every request is laid out as SYSTEM_PROMPT, then `shared_context` (problem,
+    then analysis), then the step prompt. The first two never change within a
+    flow, so providers with prompt caching only process the step prompt anew.
+    Step methods still accept the problem/analysis arguments they used to embed
+    (the agent passes them, so older registries keep working); these prompts
+    ignore them because that text is already in the prefix.
     """
 
+    SYSTEM_PROMPT = (
+        "You are a team of competitive programming experts: an algorithms architect, "
+        "a Python developer, a debugging agent and a maintenance engineer. "
+        "Each request says which role to act as. Solutions read stdin and write stdout."
+    )
+
     @staticmethod
-    def semantic_analysis(problem_description: str) -> str:
-        return f"""
+    def shared_context(problem_desc: str, analysis: str = "") -> list[str]:
+        """The stable prefix blocks every step prompt is appended to."""
+        blocks = [f"PROBLEM:\n{problem_desc}"]
+        if analysis:
+            blocks.append(f"ANALYSIS (constraints provided by the Architect):\n{analysis}")
+        return blocks
+
+    @staticmethod
+    def semantic_analysis(problem_description: str = "") -> str:
+        return """
         ACT AS: A Senior Systems Architect and Algorithms Expert.
         
-        GOAL: Analyze the following competitive programming problem. Do NOT write code yet.
-        
-        PROBLEM:
-        {problem_description}
+        GOAL: Analyze the competitive programming problem above. Do NOT write code yet.
         
         TASK:
         1. Identify the core algorithmic category (e.g., DP, Graph, Greedy).
@@ -29,19 +47,12 @@ class PromptRegistry:
         """
 
     @staticmethod
-    def generate_solution(problem_desc: str, analysis: str) -> str:
-        return f"""
+    def generate_solution(problem_desc: str = "", analysis: str = "") -> str:
+        return """
         ACT AS: A 10x Python Developer.
         
-        CONTEXT:
-        We are solving this problem:
-        {problem_desc}
-        
-        Analysis constraints provided by Architect:
-        {analysis}
-        
         TASK:
-        Write a complete, self-contained Python solution.
+        Write a complete, self-contained Python solution to the problem above.
         1. Import all necessary libraries.
         2. Handle standard input (stdin) properly.
         3. Address the Edge Cases identified in the analysis.
@@ -49,14 +60,11 @@ class PromptRegistry:
         """
 
     @staticmethod
-    def analyze_failure(code: str, error_log: str, problem_desc: str) -> str:
+    def analyze_failure(code: str, error_log: str, problem_desc: str = "") -> str:
         return f"""
         ACT AS: A Lead Debugging Agent.
         
-        STATUS: The code failed the tests.
-        
-        PROBLEM:
-        {problem_desc}
+        STATUS: The code below failed the tests.
         
         CODE:
         {code}
@@ -0,0 +1,105 @@
+import contextlib
+import fcntl
+import json
+import os
+import threading
+from collections.abc import Iterator
+
+
+class ResultSink:
+    """
+    Append-only JSONL store for benchmark rows.
+    Each row is written and flushed as soon as it is produced, so an interrupted
+    run keeps everything it finished and can be resumed from the same file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, row: dict):
+        line = json.dumps(row) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @contextlib.contextmanager
+    def claim(self) -> Iterator[None]:
+        """
+        Holds an exclusive lock file next to the results file for the duration.
+        Works across processes and, on a shared filesystem with flock support,
+        across machines. The OS drops the lock if the holder dies.
+        """
+        with open(self.path + ".lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError as e:
+                raise RuntimeError(f"{self.path} is already being written by another run") from e
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def completed_ids(self) -> set[str]:
+        """IDs of the problems already recorded in the file."""
+        if not os.path.exists(self.path):
+            return set()
+        return {str(row["id"]) for row in load_results(self.path)}
+
+
+def load_results(path: str) -> list[dict]:
+    """
+    Reads benchmark results from a JSON array or a JSONL file.
+    A JSONL file may still be growing: a torn last line is ignored.
+    """
+    with open(path) as f:
+        text = f.read()
+
+    if text.lstrip().startswith("["):
+        return list(json.loads(text))
+
+    rows = []
+    lines = text.splitlines()
+    for n, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError:
+            if n == len(lines) - 1:
+                break
+            raise
+    return rows
+
+
+def merge_results(paths: list[str], output_path: str) -> list[dict]:
+    """
+    Combines per-shard results files into one JSONL file in dataset order (the
+    rows' `position`); rows without one follow in the order they were read.
+    A problem present in several files keeps the row from the last one given.
+    """
+    merged: dict[str, dict] = {}
+    for path in paths:
+        for row in load_results(path):
+            merged[str(row["id"])] = row
+
+    unplaced = float("inf")
+    rows = sorted(merged.values(), key=lambda row: row.get("position", unplaced))
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    os.replace(tmp_path, output_path)
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 4 or sys.argv[1] != "merge":
+        print("Usage: python -m alphakhulnasoft.results merge <output.jsonl> <shard.jsonl>...")
+        sys.exit(1)
+
+    merged_rows = merge_results(sys.argv[3:], sys.argv[2])
+    print(f"🧩 Merged {len(merged_rows)} results from {len(sys.argv) - 3} files into {sys.argv[2]}")
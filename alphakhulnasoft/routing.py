@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ModelCascade:
+    """
+    Escalation ladder for a flow's models, cheapest first.
+
+    A flow starts on `tiers[0]` and moves one tier up after `escalate_after`
+    failed iterations on its current tier, or straight away when a failed test
+    run's error log contains one of `escalate_on` (e.g. the sandbox's
+    `TIME_LIMIT_EXCEEDED`, when the cheap model keeps writing brute force).
+    The last tier is kept until the flow ends.
+    """
+
+    tiers: tuple[str, ...]
+    escalate_after: int = 2
+    escalate_on: tuple[str, ...] = ()
+
+    def __post_init__(self):
+        if not self.tiers:
+            raise ValueError("ModelCascade needs at least one model")
+        # Accept any sequence, e.g. a list
+        object.__setattr__(self, "tiers", tuple(self.tiers))
+
+    def escalation_reason(self, tier: int, failures: int, error_log: str) -> str | None:
+        """Why a flow on `tier` with `failures` failed iterations there should move up, if it should."""
+        if tier + 1 >= len(self.tiers):
+            return None
+        for marker in self.escalate_on:
+            if marker in error_log:
+                return marker
+        if failures >= self.escalate_after:
+            return f"{failures} failed iterations"
+        return None
@@ -1,84 +1,736 @@
+import ast
+import contextlib
+import json
+import math
 import os
+import queue
+import selectors
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+from collections.abc import Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import ExecutionCache, code_hash
+from .checkers import Checker, get_checker
+from .tracing import record_test_time
+from .validation import CodeValidator, write_bytecode
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+WORKER_STARTUP_TIMEOUT = 30.0
+
+# `python -c LIMITED_RUN <cpu seconds> <memory bytes> <file bytes> <program>` applies
+# the rlimits ("-" = none) in the child itself, then runs the program the way
+# `python <program>` would (same `__main__`, argv, sys.path and tracebacks).
+# Unlike a `preexec_fn`, this is safe to spawn from threads. Without the
+# `resource` module (Windows) only the wall-clock timeout applies.
+LIMITED_RUN = """\
+import marshal, os, sys, traceback, types
+cpu, memory, file_size, program = sys.argv[1:]
+try:
+    import resource
+except ImportError:
+    resource = None
+if resource is not None:
+    for name, value, slack in (
+        ("RLIMIT_CPU", cpu, 1), ("RLIMIT_AS", memory, 0), ("RLIMIT_FSIZE", file_size, 0)
+    ):
+        if value != "-":
+            resource.setrlimit(getattr(resource, name), (int(value), int(value) + slack))
+compiled = program.endswith(".pyc")
+source = program[:-1] if compiled else program
+sys.argv = [source]
+sys.path[0] = os.path.dirname(source)
+main = types.ModuleType("__main__")
+main.__file__ = source
+sys.modules["__main__"] = main
+try:
+    with open(program, "rb") as f:
+        data = f.read()
+    exec(marshal.loads(data[16:]) if compiled else compile(data, source, "exec"), vars(main))
+except SystemExit:
+    raise
+except BaseException as e:
+    tb = e.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != source:
+        tb = tb.tb_next
+    traceback.print_exception(type(e), e, tb)
+    sys.exit(1)
+"""
+
+# Verdict prefixes of resource-limit failures; anything else is a Runtime Error
+TIME_LIMIT_EXCEEDED = "⏱️ Time Limit Exceeded"
+MEMORY_LIMIT_EXCEEDED = "💾 Memory Limit Exceeded"
+OUTPUT_LIMIT_EXCEEDED = "📜 Output Limit Exceeded"
+LIMIT_VERDICTS = (TIME_LIMIT_EXCEEDED, MEMORY_LIMIT_EXCEEDED, OUTPUT_LIMIT_EXCEEDED)
+WORKER_LIMITS = {
+    "time": TIME_LIMIT_EXCEEDED,
+    "memory": MEMORY_LIMIT_EXCEEDED,
+    "output": OUTPUT_LIMIT_EXCEEDED,
+}
+# Extra wait on top of a batched case's timeout before the worker itself is killed
+BATCH_GRACE_SECONDS = 1.0
+# Failures kept in the error log, to save tokens
+MAX_LOGGED_FAILURES = 3
+
+# Importing these (or assigning into any imported module) can leak state from one
+# test case into the next when cases share an interpreter.
+STATEFUL_MODULES = frozenset(
+    {"atexit", "builtins", "ctypes", "gc", "importlib", "multiprocessing", "signal", "threading"}
+)
 
 
 class Sandbox:
     """
     Safely executes generated Python code against test cases.
     Handles timeouts, captures stdout/stderr, and isolates the process.
+    Candidates are validated and byte-compiled once before any test runs.
     """
 
-    def __init__(self, timeout_seconds: int = 2):
+    def __init__(
+        self,
+        timeout_seconds: int = 2,
+        max_workers: int | None = 1,
+        max_failures: int | None = None,
+        smoke_tests: int = 0,
+        cache: ExecutionCache | None = None,
+        memory_limit_mb: int | None = 1024,
+        output_limit_bytes: int | None = 8 * 1024 * 1024,
+        batch_tests: bool = False,
+        validator: CodeValidator | None = None,
+        checker: str | Checker | None = None,
+    ):
+        """
+        - `timeout_seconds`: wall-clock limit per test, also the CPU rlimit (rounded up).
+        - `max_workers`: tests run concurrently (None = one per core); reported in order.
+        - `max_failures`: stop once this many tests have failed; the rest count as failed.
+        - `smoke_tests`: run the first N tests on their own; the rest only if all pass.
+        - `cache`: an `ExecutionCache` answering identical (code, input) runs.
+        - `memory_limit_mb` / `output_limit_bytes`: rlimits, None disables them.
+        - `batch_tests`: run every case in one worker process (see `is_batch_safe`).
+        - `validator`: the `CodeValidator` gate; its error is returned as the log.
+        - `checker`: how outputs are judged (see `checkers.get_checker`).
+        """
         self.timeout = timeout_seconds
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_failures = max_failures
+        self.smoke_tests = smoke_tests
+        self.cache = cache
+        self.memory_limit_mb = memory_limit_mb
+        self.output_limit_bytes = output_limit_bytes
+        self.batch_tests = batch_tests
+        self.validator = validator or CodeValidator()
+        self.checker = get_checker(checker)
 
-    def run_tests(self, code: str, test_cases: list[dict]) -> tuple[float, str]:
+    def run_tests(
+        self,
+        code: str,
+        test_cases: list[dict],
+        stop_event: threading.Event | None = None,
+        checker: str | Checker | None = None,
+        on_failure: Callable[[str, int], None] | None = None,
+    ) -> tuple[float, str]:
         """
         Runs the code against all provided test cases.
+        Setting `stop_event` from another thread abandons the run after the tests
+        already in flight; the remaining ones count as not passed.
+        `checker` replaces the sandbox's own checker for this call.
+        `on_failure(error_log, failures)` is called, while the remaining tests
+        run, each time a failure is added to the log; the log it gets is the
+        final one once `MAX_LOGGED_FAILURES` failures are in.
         Returns: (pass_rate [0.0-1.0], error_log [str])
         """
+        check = self.checker if checker is None else get_checker(checker)
         if not code.strip():
             return 0.0, "❌ Error: Empty code generated."
 
+        tree, issue = self.validator.check(code)
+        if tree is None:
+            return 0.0, issue.format() if issue else "❌ Error: Invalid code."
+
         passes = 0
-        logs = []
+        logs: list[str] = []
+        code_digest = code_hash(code) if self.cache is not None else None
+        # Code that may leave interpreter-wide state behind never shares an interpreter
+        shared = is_batch_safe(tree)
+        batched = self.batch_tests and shared
 
         with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as tmp:
             tmp.write(code)
             tmp_path = tmp.name
 
-        try:
-            for i, test in enumerate(test_cases):
-                input_data = str(test.get("input", ""))
-                expected = str(test.get("expected", "")).strip()
-
-                result = self._execute_single_run(tmp_path, input_data)
+        if self.smoke_tests:
+            phases = [test_cases[: self.smoke_tests], test_cases[self.smoke_tests :]]
+        else:
+            phases = [test_cases]
 
-                if result["error"]:
-                    logs.append(f"Test {i + 1} ❌: Runtime Error\n{result['error']}")
-                    continue
-
-                actual = result["output"].strip()
+        try:
+            # Tests run this instead of re-parsing the source (see `_program`)
+            compiled = self.validator.compiled(code)
+            assert compiled is not None
+            write_bytecode(compiled, tmp_path, tmp_path + "c")
+            offset = 0
+            for phase in phases:
+                results = self._run_all(tmp_path, phase, code_digest, batched, shared)
+                try:
+                    for i, (test, result) in enumerate(zip(phase, results, strict=True), offset):
+                        if stop_event is not None and stop_event.is_set():
+                            break
+                        if "duration" in result:
+                            record_test_time(result["duration"])
+                        failure = self._judge(i, test, result, check)
+                        if failure is None:
+                            passes += 1
+                            continue
+                        logs.append(failure)
+                        if on_failure is not None and len(logs) <= MAX_LOGGED_FAILURES:
+                            on_failure("\n".join(logs), len(logs))
+                        if self.max_failures and len(logs) >= self.max_failures:
+                            break
+                finally:
+                    # Cancels whatever the fail-fast policy left unconsumed
+                    results.close()
 
-                if actual == expected:
-                    passes += 1
-                else:
-                    logs.append(
-                        f"Test {i + 1} ❌: Failed.\n   Input: {input_data}\n   Expected: '{expected}'\n   Got: '{actual}'"
-                    )
+                if logs or (stop_event is not None and stop_event.is_set()):
+                    break
+                offset += len(phase)
 
         finally:
             # Cleanup
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+            for path in (tmp_path, tmp_path + "c"):
+                if os.path.exists(path):
+                    os.remove(path)
 
         pass_rate = passes / len(test_cases) if test_cases else 0.0
-        final_log = "\n".join(logs[:3])  # Only return top 3 errors to save tokens
+        final_log = "\n".join(logs[:MAX_LOGGED_FAILURES])
 
         return pass_rate, final_log
 
-    def _execute_single_run(self, file_path: str, input_str: str) -> dict:
+    def _judge(self, index: int, test: dict, result: dict, checker: Checker) -> str | None:
+        """Returns the log entry for a failed test, or None if it passed."""
+        input_data = str(test.get("input", ""))
+        expected = str(test.get("expected", ""))
+
+        if result["error"]:
+            if result["error"].startswith(LIMIT_VERDICTS):
+                return f"Test {index + 1} ❌: {result['error']}"
+            return f"Test {index + 1} ❌: Runtime Error\n{result['error']}"
+
+        if checker(input_data, expected, result["output"]):
+            return None
+        expected, actual = expected.strip(), result["output"].strip()
+        return f"Test {index + 1} ❌: Failed.\n   Input: {input_data}\n   Expected: '{expected}'\n   Got: '{actual}'"
+
+    def _run_all(
+        self,
+        file_path: str,
+        test_cases: list[dict],
+        code_digest: str | None = None,
+        batched: bool = False,
+        shared: bool = True,
+    ) -> Generator[dict, None, None]:
+        """
+        Yields one execution result per test case, in test order.
+        Closing the generator early cancels the tests that have not started yet.
+        `shared=False` keeps every test in a process of its own (see `_execute_single_run`).
+        """
+        inputs = [str(test.get("input", "")) for test in test_cases]
+        if batched and len(inputs) > 1:
+            yield from self._run_all_batched(file_path, inputs, code_digest)
+            return
+
+        if self.max_workers <= 1 or len(inputs) <= 1:
+            for input_str in inputs:
+                yield self._run_one(file_path, input_str, code_digest, shared)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(inputs)))
+        try:
+            futures = [
+                executor.submit(self._run_one, file_path, input_str, code_digest, shared)
+                for input_str in inputs
+            ]
+            for future in futures:
+                yield future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_all_batched(
+        self, file_path: str, inputs: list[str], code_digest: str | None
+    ) -> Generator[dict, None, None]:
+        """Cached cases are answered directly; the rest go to the worker as one batch."""
+        keys = [self._cache_key(code_digest, input_str) for input_str in inputs]
+        cached = [
+            self.cache.get(key) if self.cache is not None and key is not None else None
+            for key in keys
+        ]
+        fresh = self._run_batch(
+            file_path, [s for s, c in zip(inputs, cached, strict=True) if c is None]
+        )
+        try:
+            for key, hit in zip(keys, cached, strict=True):
+                if hit is not None:
+                    yield hit
+                    continue
+                result = next(fresh)
+                self._remember(key, result)
+                yield result
+        finally:
+            fresh.close()
+
+    def _run_batch(self, file_path: str, inputs: list[str]) -> Generator[dict, None, None]:
         """
-        Low-level execution with timeout and pipe management.
+        Runs `inputs` through one worker, one result per case. If the worker hangs
+        or dies, that case gets its verdict and the rest run one process each.
+        """
+        worker = self._checkout_worker()
+        done = 0
+        failure = None
+        try:
+            worker.wait_ready()
+            start = time.perf_counter()
+            for result in worker.run_batch(
+                file_path,
+                inputs,
+                self.timeout,
+                BATCH_GRACE_SECONDS,
+                cpu_seconds=math.ceil(self.timeout),
+                output_limit=self.output_limit_bytes,
+            ):
+                done += 1
+                now = time.perf_counter()
+                yield {**self._worker_result(result), "duration": now - start}
+                start = time.perf_counter()
+        except (TimeoutError, EOFError) as e:
+            failure = self._worker_failure(e, worker.kill())
+        except RuntimeError:
+            worker.kill()
+        finally:
+            # An abandoned batch would keep the worker busy, so it is replaced
+            self._checkin_worker(worker, healthy=done == len(inputs) and worker.alive())
+
+        if failure is not None:
+            done += 1
+            yield failure
+        for input_str in inputs[done:]:
+            yield self._run_one(file_path, input_str, code_digest=None)
+
+    def _cache_key(self, code_digest: str | None, input_str: str) -> str | None:
+        if self.cache is None or code_digest is None:
+            return None
+        scope = (
+            f"timeout={self.timeout},memory={self.memory_limit_mb},output={self.output_limit_bytes}"
+        )
+        return self.cache.make_key(code_digest, input_str, scope)
+
+    def _remember(self, key: str | None, result: dict):
+        # Infrastructure failures say nothing about the code, and a time limit
+        # verdict depends on how loaded the machine was, so neither is remembered
+        error = result["error"] or ""
+        flaky = error.startswith(("System Error", TIME_LIMIT_EXCEEDED))
+        if self.cache is not None and key is not None and not flaky:
+            self.cache.put(key, result)
+
+    def _run_one(
+        self, file_path: str, input_str: str, code_digest: str | None, shared: bool = True
+    ) -> dict:
+        """
+        Executes one test, consulting the execution cache when one is configured.
+        Fresh runs carry their wall time in `duration`.
+        """
+        key = self._cache_key(code_digest, input_str)
+        if self.cache is not None and key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+        result = self._execute_single_run(file_path, input_str, shared)
+        self._remember(key, result)
+        result["duration"] = time.perf_counter() - start
+        return result
+
+    def _execute_single_run(self, file_path: str, input_str: str, shared: bool = True) -> dict:
+        """
+        Low-level execution with timeout, rlimits and bounded pipe capture.
+        Always a fresh process here; `shared=False` tells subclasses that reuse
+        interpreters that this code must not run in one.
         """
         try:
             # Run the python script as a subprocess
-            process = subprocess.run(
-                [sys.executable, file_path],
-                input=input_str,
-                text=True,
-                capture_output=True,
-                timeout=self.timeout,
+            limits = self._limit_args(cpu_seconds=math.ceil(self.timeout))
+            process = subprocess.Popen(
+                [sys.executable, "-c", LIMITED_RUN, *limits, _program(file_path)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except Exception as e:
+            return {"output": "", "error": f"System Error: {str(e)}"}
+
+        try:
+            stdout, stderr, overflow = _communicate(
+                process, input_str.encode(), self.timeout, self.output_limit_bytes
             )
+        except TimeoutError:
+            return {"output": "", "error": self._limit_error(TIME_LIMIT_EXCEEDED)}
+        except Exception as e:
+            return {"output": "", "error": f"System Error: {str(e)}"}
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            for pipe in (process.stdin, process.stdout, process.stderr):
+                if pipe is not None:
+                    pipe.close()
 
-            # Check for non-zero exit codes (Runtime Errors)
-            if process.returncode != 0:
-                return {"output": "", "error": process.stderr}
+        if overflow:
+            return {"output": "", "error": self._limit_error(OUTPUT_LIMIT_EXCEEDED)}
 
-            return {"output": process.stdout, "error": None}
+        errors = stderr.decode("utf-8", errors="replace")
+        # Check for non-zero exit codes (Runtime Errors)
+        if process.returncode != 0:
+            limit = _exit_limit(process.returncode) or _memory_error(errors)
+            if limit is not None:
+                return {"output": "", "error": self._limit_error(limit)}
+            return {"output": "", "error": errors}
 
-        except subprocess.TimeoutExpired:
-            return {"output": "", "error": f"⏱️ Time Limit Exceeded ({self.timeout}s)"}
-        except Exception as e:
+        return {"output": stdout.decode("utf-8", errors="replace"), "error": None}
+
+    def _spawn(self) -> "_Worker":
+        # CPU time is budgeted per request by the worker itself
+        return _Worker(self._limit_args(cpu_seconds=None)[1:])
+
+    def _checkout_worker(self) -> "_Worker":
+        return self._spawn()
+
+    def _checkin_worker(self, worker: "_Worker", healthy: bool):
+        if healthy:
+            worker.close()
+        else:
+            worker.kill()
+
+    def _worker_result(self, result: dict) -> dict:
+        """Turns a worker's `limit` answer into the matching verdict."""
+        limit = result.pop("limit", None)
+        if limit is not None:
+            return {"output": "", "error": self._limit_error(WORKER_LIMITS[limit])}
+        return result
+
+    def _worker_failure(self, error: Exception, exit_code: int) -> dict:
+        """Result for the test a worker was running when it hung or died."""
+        if isinstance(error, TimeoutError):
+            return {"output": "", "error": self._limit_error(TIME_LIMIT_EXCEEDED)}
+        verdict = _exit_limit(exit_code)
+        if verdict is not None:
+            return {"output": "", "error": self._limit_error(verdict)}
+        return {"output": "", "error": f"Runtime Error: process crashed (exit code {exit_code})"}
+
+    def _limit_args(self, cpu_seconds: int | None) -> list[str]:
+        """[cpu seconds, memory bytes, file bytes] as the child applies them ("-" = none)."""
+        memory = self.memory_limit_mb * 1024 * 1024 if self.memory_limit_mb else None
+        return [
+            str(limit) if limit else "-" for limit in (cpu_seconds, memory, self.output_limit_bytes)
+        ]
+
+    def _limit_error(self, verdict: str) -> str:
+        if verdict == TIME_LIMIT_EXCEEDED:
+            return f"{verdict} ({self.timeout}s)"
+        if verdict == MEMORY_LIMIT_EXCEEDED:
+            return f"{verdict} ({self.memory_limit_mb} MB)"
+        return f"{verdict} ({self.output_limit_bytes} bytes)"
+
+
+def is_batch_safe(code: str | ast.Module) -> bool:
+    """
+    False for code (source or parsed tree) that may leave interpreter-wide state
+    behind for the next test case: importing a `STATEFUL_MODULES` module, or
+    assigning/deleting attributes or items of anything imported
+    (`sys.stdout = ...`, `os.environ[k] = ...`).
+    """
+    try:
+        tree = code if isinstance(code, ast.Module) else ast.parse(code)
+    except (SyntaxError, ValueError):
+        # Fails the same way however it is run
+        return True
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] in STATEFUL_MODULES:
+                    return False
+                modules.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or "").split(".")[0] in STATEFUL_MODULES:
+                return False
+            modules.update(alias.asname or alias.name for alias in node.names)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign | ast.Delete):
+            targets = node.targets
+        elif isinstance(node, ast.AugAssign | ast.AnnAssign):
+            targets = [node.target]
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in ("setattr", "delattr")
+            and node.args
+        ):
+            targets = [ast.Attribute(value=node.args[0], attr="", ctx=ast.Store())]
+        else:
+            continue
+        for target in targets:
+            while isinstance(target, ast.Attribute | ast.Subscript):
+                target = target.value
+                if isinstance(target, ast.Name) and target.id in modules:
+                    return False
+    return True
+
+
+def _program(file_path: str) -> str:
+    """The bytecode `run_tests` wrote next to the source, if there is one."""
+    compiled = file_path + "c"
+    return compiled if os.path.exists(compiled) else file_path
+
+
+def _exit_limit(returncode: int) -> str | None:
+    """Maps death by an rlimit signal to its verdict."""
+    if returncode == -signal.SIGXCPU:
+        return TIME_LIMIT_EXCEEDED
+    if returncode == -signal.SIGXFSZ:
+        return OUTPUT_LIMIT_EXCEEDED
+    return None
+
+
+def _memory_error(stderr: str) -> str | None:
+    lines = stderr.strip().splitlines()
+    if lines and lines[-1].startswith("MemoryError"):
+        return MEMORY_LIMIT_EXCEEDED
+    return None
+
+
+def _feed(pipe, data: bytes):
+    try:
+        pipe.write(data)
+        pipe.close()
+    except OSError:
+        # The child exited (or was killed) without reading all of its input
+        pass
+
+
+def _communicate(
+    process: subprocess.Popen, input_bytes: bytes, timeout: float, limit: int | None
+) -> tuple[bytes, bytes, bool]:
+    """
+    `Popen.communicate` with bounded buffers. Returns (stdout, stderr, overflow):
+    stdout past `limit` stops the run with overflow=True, stderr past `limit` is
+    dropped. Raises TimeoutError once `timeout` seconds have passed.
+    """
+    assert process.stdout is not None and process.stderr is not None
+    threading.Thread(target=_feed, args=(process.stdin, input_bytes), daemon=True).start()
+
+    out_fd, err_fd = process.stdout.fileno(), process.stderr.fileno()
+    buffers = {out_fd: bytearray(), err_fd: bytearray()}
+    deadline = time.monotonic() + timeout
+    # selectors rather than select.select, which can't watch fds >= FD_SETSIZE (1024)
+    with selectors.DefaultSelector() as selector:
+        for fd in buffers:
+            selector.register(fd, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            for key, _ in selector.select(remaining):
+                fd = int(key.fd)
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    selector.unregister(fd)
+                    continue
+                buffer = buffers[fd]
+                if limit is None or len(buffer) + len(chunk) <= limit:
+                    buffer += chunk
+                elif fd == out_fd:
+                    return bytes(buffer), bytes(buffers[err_fd]), True
+                else:
+                    buffer += chunk[: limit - len(buffer)]
+
+    try:
+        process.wait(timeout=max(deadline - time.monotonic(), 0))
+    except subprocess.TimeoutExpired as e:
+        raise TimeoutError from e
+    return bytes(buffers[out_fd]), bytes(buffers[err_fd]), False
+
+
+class _Worker:
+    """Handle on one warm interpreter process (see `sandbox_worker.py`)."""
+
+    def __init__(self, limits: list[str] | None = None):
+        """`limits`: [memory bytes, file bytes] the worker applies to itself ("-" = none)."""
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, *(limits or [])],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.ready = False
+        self._buffer = bytearray()
+
+    def wait_ready(self):
+        if self.ready:
+            return
+        try:
+            self._read_message(WORKER_STARTUP_TIMEOUT)
+        except (TimeoutError, EOFError) as e:
+            raise RuntimeError(f"sandbox worker failed to start: {e!r}") from e
+        self.ready = True
+
+    def run(self, file_path: str, input_str: str, timeout: float, **limits) -> dict:
+        """
+        Executes one test. `limits` are `cpu_seconds` / `output_limit` (see the worker).
+        Raises TimeoutError on a hang, EOFError on a crash.
+        """
+        message = {"path": file_path, "input": input_str, **limits}
+        request = json.dumps(message).encode() + b"\n"
+        assert self.process.stdin is not None
+        try:
+            self.process.stdin.write(request)
+            self.process.stdin.flush()
+        except BrokenPipeError as e:
+            raise EOFError("worker pipe closed") from e
+        return self._read_message(timeout)
+
+    def run_batch(
+        self, file_path: str, inputs: list[str], timeout: float, grace: float, **limits
+    ) -> Generator[dict, None, None]:
+        """
+        Yields one result per input as the worker finishes them. Each case may
+        take `timeout` + `grace` seconds; raises like `run` otherwise.
+        """
+        message = {"path": file_path, "inputs": inputs, "timeout": timeout, **limits}
+        request = json.dumps(message).encode() + b"\n"
+        assert self.process.stdin is not None
+        try:
+            self.process.stdin.write(request)
+            self.process.stdin.flush()
+        except BrokenPipeError as e:
+            raise EOFError("worker pipe closed") from e
+        for _ in inputs:
+            yield self._read_message(timeout + grace)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _read_message(self, timeout: float) -> dict:
+        assert self.process.stdout is not None
+        fd = self.process.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while b"\n" not in self._buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    raise TimeoutError
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise EOFError("worker exited")
+                self._buffer += chunk
+        end = self._buffer.index(b"\n")
+        line = bytes(self._buffer[:end])
+        del self._buffer[: end + 1]
+        return dict(json.loads(line))
+
+    def kill(self) -> int:
+        self.process.kill()
+        exit_code = int(self.process.wait())
+        self._close_pipes()
+        return exit_code
+
+    def close(self):
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+        self._close_pipes()
+
+    def _close_pipes(self):
+        for pipe in (self.process.stdin, self.process.stdout):
+            if pipe is not None:
+                # Unflushed request data the dead worker will never read is dropped
+                with contextlib.suppress(OSError):
+                    pipe.close()
+
+
+class WarmSandbox(Sandbox):
+    """
+    Drop-in `Sandbox` backed by a pool of `pool_size` pre-started interpreters,
+    so tests don't pay interpreter startup. Hung or crashed workers are replaced,
+    and code that could change interpreter-wide state runs cold. POSIX only.
+    """
+
+    def __init__(
+        self,
+        timeout_seconds: int = 2,
+        max_workers: int | None = 1,
+        pool_size: int | None = None,
+        **kwargs,
+    ):
+        super().__init__(timeout_seconds=timeout_seconds, max_workers=max_workers, **kwargs)
+        self.pool_size = pool_size or self.max_workers
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        for _ in range(self.pool_size):
+            self._idle.put(self._spawn())
+
+    def _checkout_worker(self) -> _Worker:
+        return self._idle.get()
+
+    def _checkin_worker(self, worker: _Worker, healthy: bool):
+        if not healthy:
+            worker.kill()
+            worker = self._spawn()
+        self._idle.put(worker)
+
+    def _execute_single_run(self, file_path: str, input_str: str, shared: bool = True) -> dict:
+        if not shared:
+            # Could patch builtins, sys.modules, ... for whatever the worker runs next
+            return super()._execute_single_run(file_path, input_str)
+        worker = self._idle.get()
+        try:
+            worker.wait_ready()
+            result = worker.run(
+                file_path,
+                input_str,
+                self.timeout,
+                cpu_seconds=math.ceil(self.timeout),
+                output_limit=self.output_limit_bytes,
+            )
+            return self._worker_result(result)
+        except (TimeoutError, EOFError) as e:
+            exit_code = worker.kill()
+            worker = self._spawn()
+            return self._worker_failure(e, exit_code)
+        except RuntimeError as e:
+            worker.kill()
+            worker = self._spawn()
             return {"output": "", "error": f"System Error: {str(e)}"}
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        """Shuts down all idle workers."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> "WarmSandbox":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,279 @@
+"""
+Warm interpreter worker used by `WarmSandbox`.
+
+Runs as a standalone script (never imported by the package) so that spawning it
+does not pay for the package's own imports. The worker reads one JSON request
+per line from its protocol pipe (after announcing `{"ready": true}` once the
+warm-up imports are done), executes the candidate file in a fresh
+`__main__` namespace with stdout/stderr redirected to in-memory buffers and the
+test's input behind fd 0 (so `open(0).read()` and `os.read(0, n)` see it, as in
+a plain run), and answers with one JSON line: {"output": str, "error": str | None}.
+
+Requests may carry `cpu_seconds` (a fresh RLIMIT_CPU budget for this run) and
+`output_limit` (bytes). A run that hits the memory or output limit is answered
+with {"output": "", "error": None, "limit": "memory" | "output"}; one that uses
+up its CPU budget is killed by SIGXCPU. Address-space and file-size rlimits come
+as command-line arguments (`sandbox_worker.py <memory bytes> <file bytes>`, "-" =
+none) and the worker applies them to itself before anything else.
+
+A batch request carries `inputs` (a list) instead of `input`, plus a per-case
+`timeout`: the file is compiled once and every input is run against it in turn,
+answering one JSON line per case ("limit": "time" for a case over its timeout).
+
+When the sandbox left bytecode next to the file (`<path>c`), that is loaded
+once and reused for every request on the same file instead of parsing the source.
+"""
+
+import io
+import json
+import marshal
+import math
+import os
+import runpy
+import signal
+import sys
+import tempfile
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+# Modules competitive-programming solutions import most often. Loading them once
+# here keeps the per-test cost of `import` close to a dict lookup.
+WARM_IMPORTS = (
+    "bisect",
+    "collections",
+    "functools",
+    "heapq",
+    "itertools",
+    "math",
+    "re",
+    "string",
+)
+
+
+class _OutputLimitExceeded(BaseException):
+    """Raised out of `print` so candidate `except Exception` blocks cannot swallow it."""
+
+
+class _TimeLimitExceeded(BaseException):
+    """Raised from SIGALRM when a batched case runs past its timeout."""
+
+
+def _on_alarm(signum, frame):
+    raise _TimeLimitExceeded
+
+
+class _CappedBuffer(io.BytesIO):
+    """stdout raises past `limit` bytes; stderr (strict=False) is silently truncated."""
+
+    def __init__(self, limit: int | None, strict: bool):
+        super().__init__()
+        self.limit = limit
+        self.strict = strict
+
+    def write(self, b) -> int:
+        size = len(b)
+        if self.limit is not None and self.tell() + size > self.limit:
+            if self.strict:
+                raise _OutputLimitExceeded
+            b = bytes(b)[: max(self.limit - self.tell(), 0)]
+        super().write(b)
+        return size
+
+
+# ((compiled path, mtime_ns, size), code object) of the most recently loaded bytecode
+_last_compiled: list = [None, None]
+
+
+def _load_compiled(file_path: str):
+    """Code object from the .pyc the sandbox wrote for `file_path`, or None."""
+    compiled_path = file_path + "c"
+    try:
+        stat = os.stat(compiled_path)
+    except OSError:
+        return None
+    key = (compiled_path, stat.st_mtime_ns, stat.st_size)
+    if _last_compiled[0] != key:
+        with open(compiled_path, "rb") as f:
+            # Skip the 16-byte .pyc header
+            _last_compiled[:] = [key, marshal.loads(f.read()[16:])]
+    return _last_compiled[1]
+
+
+def _set_cpu_budget(seconds: int | None):
+    """RLIMIT_CPU counts the whole worker lifetime, so move the soft limit per run."""
+    if resource is None or not seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = math.ceil(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + seconds, hard))
+
+
+def _attach_stdin(input_str: str):
+    """Puts `input_str` behind fd 0 and returns a text stream reading it."""
+    try:
+        os.fstat(0)
+    except OSError:
+        # A candidate's `open(0)` closed it; refill the slot so the temp file lands elsewhere
+        os.open(os.devnull, os.O_RDONLY)
+    with tempfile.TemporaryFile() as f:
+        f.write(input_str.encode())
+        f.seek(0)
+        # The duplicate shares the file (and offset) and outlives `f`
+        os.dup2(f.fileno(), 0)
+    return open(0, encoding="utf-8", closefd=False)
+
+
+def _detach_stdin(stdin):
+    stdin.close()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    if devnull != 0:
+        os.dup2(devnull, 0)
+        os.close(devnull)
+
+
+def _run_candidate(
+    file_path: str, input_str: str, output_limit: int | None = None, code=None
+) -> dict:
+    """Runs the file (or its precompiled `code`) as `__main__` with `input_str` as stdin."""
+    stdin = _attach_stdin(input_str)
+    out_buf = _CappedBuffer(output_limit, strict=True)
+    err_buf = _CappedBuffer(output_limit, strict=False)
+    stdout = io.TextIOWrapper(out_buf, encoding="utf-8", write_through=True)
+    stderr = io.TextIOWrapper(err_buf, encoding="utf-8", write_through=True)
+
+    saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+    saved_argv = sys.argv
+    saved_path0 = sys.path[0]
+    saved_cwd = os.getcwd()
+    saved_recursion = sys.getrecursionlimit()
+
+    sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+    sys.argv = [file_path]
+    sys.path[0] = os.path.dirname(file_path)
+    exit_code = 0
+    limit = None
+    try:
+        if code is None:
+            runpy.run_path(file_path, run_name="__main__")
+        else:
+            exec(
+                code, {"__name__": "__main__", "__file__": file_path, "__builtins__": __builtins__}
+            )
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=stderr)
+            exit_code = 1
+    except MemoryError:
+        limit = "memory"
+    except _OutputLimitExceeded:
+        limit = "output"
+    except _TimeLimitExceeded:
+        limit = "time"
+    except BaseException as e:
+        # Drop the runpy/worker frames so the traceback matches `python file.py`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != file_path:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb, file=stderr)
+        exit_code = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        _detach_stdin(stdin)
+        sys.argv = saved_argv
+        sys.path[0] = saved_path0
+        os.chdir(saved_cwd)
+        sys.setrecursionlimit(saved_recursion)
+
+    if limit is not None:
+        return {"output": "", "error": None, "limit": limit}
+
+    stdout.flush()
+    stderr.flush()
+    output = out_buf.getvalue().decode("utf-8", errors="replace")
+    errors = err_buf.getvalue().decode("utf-8", errors="replace")
+
+    if exit_code != 0:
+        return {"output": "", "error": errors}
+    return {"output": output, "error": None}
+
+
+def _set_process_limits(memory: str, file_size: str):
+    if resource is None:
+        return
+    for limit, value in ((resource.RLIMIT_AS, memory), (resource.RLIMIT_FSIZE, file_size)):
+        if value != "-":
+            resource.setrlimit(limit, (int(value), int(value)))
+
+
+def main() -> None:
+    if len(sys.argv) == 3:
+        _set_process_limits(*sys.argv[1:])
+
+    # Keep private handles on the protocol pipes, then point fds 0/1 at /dev/null
+    # so a candidate using the raw file descriptors cannot corrupt the protocol.
+    # Each run puts its input behind fd 0 (see `_attach_stdin`).
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    for name in WARM_IMPORTS:
+        __import__(name)
+    proto_out.write(b'{"ready": true}\n')
+    proto_out.flush()
+
+    signal.signal(signal.SIGALRM, _on_alarm)
+    for line in proto_in:
+        request = json.loads(line)
+        if "inputs" in request:
+            _run_batch(request, proto_out)
+            continue
+        _set_cpu_budget(request.get("cpu_seconds"))
+        response = _run_candidate(
+            request["path"],
+            request["input"],
+            request.get("output_limit"),
+            _load_compiled(request["path"]),
+        )
+        proto_out.write(json.dumps(response).encode() + b"\n")
+        proto_out.flush()
+
+
+def _run_batch(request: dict, proto_out) -> None:
+    file_path = request["path"]
+    code = _load_compiled(file_path)
+    if code is None:
+        try:
+            with open(file_path, "rb") as f:
+                code = compile(f.read(), file_path, "exec")
+        except (OSError, SyntaxError, ValueError):
+            # Let every case report the error exactly as a plain run would
+            code = None
+
+    for input_str in request["inputs"]:
+        _set_cpu_budget(request.get("cpu_seconds"))
+        if request.get("timeout"):
+            signal.setitimer(signal.ITIMER_REAL, request["timeout"])
+        try:
+            response = _run_candidate(file_path, input_str, request.get("output_limit"), code)
+        except _TimeLimitExceeded:
+            # The alarm fired after the candidate finished, while cleaning up
+            response = {"output": "", "error": None, "limit": "time"}
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        proto_out.write(json.dumps(response).encode() + b"\n")
+        proto_out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import hashlib
+import re
+
+# Policies for a repair loop that stopped making progress
+STAGNATION_POLICIES = ("stop", "restart", "escalate")
+# "escalate" raises the sampling temperature by this much per step, up to the max
+TEMPERATURE_STEP = 0.3
+MAX_TEMPERATURE = 1.0
+
+_TEST_VERDICT = re.compile(r"^Test (\d+) ❌: (.*)$")
+_EXCEPTION = re.compile(r"^(\w+(?:\.\w+)*(?:Error|Exception|Exit|Interrupt))\b")
+
+
+def code_fingerprint(code: str) -> str:
+    """
+    Identifies a version of the code by its exact text: a repair that only
+    re-indents, or changes whitespace inside a string, is still a change.
+    """
+    return hashlib.sha256(code.encode(errors="surrogatepass")).hexdigest()[:16]
+
+
+def failure_fingerprint(error_log: str) -> str:
+    """
+    Identifies how a test run failed: which tests, with which verdict and
+    exception type. Messages, values and line numbers are left out, so the
+    same bug reported with different details gives the same fingerprint.
+    """
+    parts = []
+    for line in error_log.splitlines():
+        line = line.strip()
+        verdict = _TEST_VERDICT.match(line)
+        if verdict:
+            parts.append(f"{verdict.group(1)}:{verdict.group(2)}")
+            continue
+        exception = _EXCEPTION.match(line)
+        if exception:
+            parts.append(exception.group(1))
+    if not parts:
+        # No per-test verdicts (compile errors, empty code): digits vary, the rest does not
+        parts = [re.sub(r"\d+", "N", error_log.strip().split("\n")[0])]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def detect_stagnation(attempts: list[dict], window: int = 3) -> str | None:
+    """
+    Why the latest of `attempts` ({"code", "failure", "pass_rate"} fingerprints,
+    oldest first) shows the loop is not getting anywhere, or None:
+    the repair returned the code unchanged, went back to an earlier version,
+    or `window` versions in a row failed the same way without a better pass rate.
+    """
+    if len(attempts) < 2:
+        return None
+    latest, earlier = attempts[-1], attempts[:-1]
+    if earlier[-1]["code"] == latest["code"]:
+        return "repair returned the code unchanged"
+    if any(attempt["code"] == latest["code"] for attempt in earlier):
+        return "repair cycled back to an earlier version"
+
+    recent = attempts[-window:]
+    if (
+        window > 1
+        and len(recent) == window
+        and len({attempt["failure"] for attempt in recent}) == 1
+        and latest["pass_rate"] <= recent[0]["pass_rate"]
+    ):
+        return f"same failure for {window} iterations"
+    return None
@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+
+# The span of the flow step currently running in this thread / asyncio task.
+# LLM calls and sandbox runs made inside the step add their usage to it.
+_current_span: ContextVar[dict | None] = ContextVar("current_span", default=None)
+_span_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def span(history: list[dict], name: str, **attrs) -> Iterator[dict]:
+    """Times a block and appends it to `history` as a {"kind": "span"} entry."""
+    record = {
+        "kind": "span",
+        "name": name,
+        **attrs,
+        "duration": 0.0,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "cost": 0.0,
+        "test_times": [],
+    }
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = round(time.perf_counter() - start, 4)
+        _current_span.reset(token)
+        history.append(record)
+
+
+def traced(step):
+    """
+    Wraps a `step_*`/`astep_*` method of `AlphaRepairAgent` in a span stored in
+    `state.history`. Async twins report under the sync step's name.
+    """
+    name = step.__name__.removeprefix("a") if step.__name__.startswith("astep_") else step.__name__
+
+    if asyncio.iscoroutinefunction(step):
+
+        @functools.wraps(step)
+        async def async_wrapper(self, state, *args, **kwargs):
+            with span(state.history, name, iter=state.iterations):
+                return await step(self, state, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(step)
+    def wrapper(self, state, *args, **kwargs):
+        with span(state.history, name, iter=state.iterations):
+            return step(self, state, *args, **kwargs)
+
+    return wrapper
+
+
+def record_llm_usage(
+    prompt_tokens: int, completion_tokens: int, cost: float, cached_tokens: int = 0
+):
+    """`cached_tokens` is the part of `prompt_tokens` read from the provider's prompt cache."""
+    current = _current_span.get()
+    if current is None:
+        return
+    with _span_lock:
+        current["llm_calls"] += 1
+        current["prompt_tokens"] += prompt_tokens
+        current["completion_tokens"] += completion_tokens
+        current["cached_tokens"] += cached_tokens
+        current["cost"] += cost
+
+
+def annotate_span(**attrs):
+    """Adds attributes (e.g. the model a step used) to the current span."""
+    current = _current_span.get()
+    if current is not None:
+        current.update(attrs)
+
+
+def record_test_time(seconds: float):
+    current = _current_span.get()
+    if current is None:
+        return
+    with _span_lock:
+        current["test_times"].append(round(seconds, 4))
+
+
+def summarize_spans(spans: list[dict]) -> dict[str, dict]:
+    """Per-step totals: {name: {"calls", "duration", "prompt_tokens", ...}}."""
+    stages: dict[str, dict] = {}
+    for s in spans:
+        stage = stages.setdefault(
+            s["name"],
+            {
+                "calls": 0,
+                "duration": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cached_tokens": 0,
+                "cost": 0.0,
+            },
+        )
+        stage["calls"] += 1
+        stage["duration"] += s["duration"]
+        stage["prompt_tokens"] += s["prompt_tokens"]
+        stage["completion_tokens"] += s["completion_tokens"]
+        # Spans recorded before prompt caching was tracked have no count
+        stage["cached_tokens"] += s.get("cached_tokens", 0)
+        stage["cost"] += s["cost"]
+    return stages
@@ -1,13 +1,26 @@
-import json
+import functools
 import os
 
-# Fix matplotlib backend for Colab/headless environments
-os.environ.pop('MPLBACKEND', None)  # Remove incompatible backend
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
+
+from .results import load_results
+
+
+@functools.cache
+def _plotting():
+    """
+    (pyplot, seaborn), imported on first use with the non-interactive Agg backend,
+    so merely importing this module never touches matplotlib's global state.
+    """
+    # Fix matplotlib backend for Colab/headless environments
+    os.environ.pop("MPLBACKEND", None)  # Remove incompatible backend
+    import matplotlib
+
+    matplotlib.use("Agg")  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    return plt, sns
 
 
 class AlphaPlotter:
@@ -16,9 +29,10 @@ class AlphaPlotter:
     """
 
     def __init__(self, results_file: str):
-        with open(results_file) as f:
-            self.data = json.load(f)
+        # Accepts the JSONL stream of a run that is still in progress
+        self.data = load_results(results_file)
         self.df = pd.DataFrame(self.data)
+        plt, sns = _plotting()
 
         # Basic styling
         try:
@@ -55,6 +69,7 @@ class AlphaPlotter:
         # Cumulative Sum (Pass@K equivalent)
         cumulative = iter_counts.cumsum()
 
+        plt, sns = _plotting()
         plt.figure(figsize=(10, 6))
 
         # Bar chart for specific iteration wins
@@ -95,6 +110,7 @@ class AlphaPlotter:
         if self.df.empty:
             return
 
+        plt, sns = _plotting()
         plt.figure(figsize=(10, 6))
 
         # Color by Solved/Failed
@@ -148,4 +164,4 @@ if __name__ == "__main__":
         plotter.plot_repair_trajectory()
         plotter.plot_efficiency_matrix()
     else:
-        print("Usage: python -m alphakhulnasoft.visualizer <results_file.json>")
+        print("Usage: python -m alphakhulnasoft.visualizer <results_file.jsonl>")
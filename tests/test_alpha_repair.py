@@ -0,0 +1,365 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from alphakhulnasoft.alpha_repair import AlphaRepairAgent
+from alphakhulnasoft.llm import LLMError, LLMProvider
+from alphakhulnasoft.routing import ModelCascade
+from alphakhulnasoft.sandbox import Sandbox
+
+TESTS = [{"input": "2", "expected": "4"}, {"input": "-1", "expected": "0"}]
+BUGGY = "n = int(input()); print(n * 2)"
+FIXED = "n = int(input()); print(max(n, 0) * 2)"
+
+
+def test_arun_flow_repairs_until_solved(mocker):
+    agent = AlphaRepairAgent(max_retries=3)
+    replies = iter(["- Algo: math", BUGGY, "ROOT CAUSE: negatives", FIXED])
+    acomplete = mocker.patch.object(
+        agent.llm, "acomplete", side_effect=lambda *a, **k: next(replies)
+    )
+
+    result = asyncio.run(agent.arun_flow("Double n, 0 for negatives.", tests=TESTS))
+
+    assert result["status"] == "SOLVED"
+    assert result["solution"] == FIXED
+    assert result["metrics"]["iterations"] == 2
+    assert acomplete.call_count == 4
+
+
+def test_best_of_n_search_keeps_passing_candidate(mocker):
+    agent = AlphaRepairAgent(max_retries=2, num_candidates=3)
+
+    def complete(prompt, sample=0, **kwargs):
+        if "Analyze" in prompt:
+            return "- Algo: math"
+        return FIXED if sample == 2 else BUGGY
+
+    mocker.patch.object(agent.llm, "complete", side_effect=complete)
+    run_tests = mocker.spy(agent.sandbox, "run_tests")
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    assert result["status"] == "SOLVED"
+    assert result["solution"] == FIXED
+    assert result["metrics"]["iterations"] == 1
+    assert result["metrics"]["flow_depth"] == 0
+    # The winning candidate is not re-run by step_execute_tests
+    assert sum(call.args[0] == FIXED for call in run_tests.call_args_list) == 1
+
+
+def test_async_best_of_n_cancels_pending_candidates(mocker):
+    agent = AlphaRepairAgent(max_retries=2, num_candidates=2)
+    cancelled = []
+
+    async def acomplete(prompt, sample=0, **kwargs):
+        if "Analyze" in prompt:
+            return "- Algo: math"
+        if sample == 0:
+            return FIXED
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(sample)
+            raise
+        return BUGGY
+
+    mocker.patch.object(agent.llm, "acomplete", side_effect=acomplete)
+
+    result = asyncio.run(agent.arun_flow("Double n, 0 for negatives.", tests=TESTS))
+
+    assert result["status"] == "SOLVED"
+    assert result["solution"] == FIXED
+    assert cancelled == [1]
+
+
+def test_run_flow_records_stage_spans(mocker):
+    agent = AlphaRepairAgent(max_retries=2, stream_code=False)
+    replies = iter(["- Algo: math", FIXED])
+
+    def completion(**kwargs):
+        message = SimpleNamespace(content=next(replies))
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    litellm = SimpleNamespace(completion=completion, completion_cost=lambda **k: 0.5)
+    mocker.patch.object(agent.llm, "_litellm", return_value=litellm)
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    names = [s["name"] for s in result["spans"]]
+    assert names == ["step_semantic_analysis", "step_generate_solution", "step_execute_tests"]
+    assert result["spans"][0]["llm_calls"] == 1
+    assert len(result["spans"][2]["test_times"]) == len(TESTS)
+    assert result["metrics"]["prompt_tokens"] == 200
+    assert result["metrics"]["cost"] == 1.0
+
+
+def test_failed_llm_call_ends_flow_without_sandboxing(mocker):
+    agent = AlphaRepairAgent(max_retries=3)
+
+    def complete(prompt, **kwargs):
+        if "Analyze" in prompt:
+            return "- Algo: math"
+        raise LLMError("gpt-4o call failed after 4 attempt(s): HTTP 503")
+
+    mocker.patch.object(agent.llm, "complete", side_effect=complete)
+    run_tests = mocker.spy(agent.sandbox, "run_tests")
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    assert result["status"] == "FAILED"
+    assert result["solution"] == ""
+    run_tests.assert_not_called()
+
+
+def test_cascade_escalates_after_failed_iterations(mocker):
+    cascade = ModelCascade(tiers=("cheap", "strong"), escalate_after=1)
+    agent = AlphaRepairAgent(
+        max_retries=3, cascade=cascade, step_models={"semantic_analysis": "tiny"}
+    )
+    agent.llm.backoff_seconds = 0.25
+
+    def complete(self, prompt, **kwargs):
+        if "Analyze" in prompt:
+            return "- Algo: math"
+        if "Debugging Agent" in prompt:
+            return "ROOT CAUSE: negatives"
+        return FIXED if self.model == "strong" else BUGGY
+
+    mocker.patch.object(LLMProvider, "complete", autospec=True, side_effect=complete)
+    finalize = mocker.spy(agent, "_finalize_result")
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    assert result["status"] == "SOLVED"
+    models = {(s["name"], s["iter"]): s.get("model") for s in result["spans"]}
+    assert models[("step_semantic_analysis", 0)] == "tiny"
+    assert models[("step_generate_solution", 0)] == "cheap"
+    # The first failed iteration moves the debugger and the repair up a tier
+    assert models[("step_analyze_failure", 1)] == "strong"
+    assert models[("step_apply_fix", 1)] == "strong"
+    assert result["metrics"]["iterations"] == 2
+    history = finalize.call_args.args[0].history
+    assert [h["model"] for h in history if h.get("kind") == "repair"] == ["strong"]
+    # Escalated tiers retry like the base provider
+    assert agent._providers["strong"].backoff_seconds == 0.25
+
+
+SLOW_BUGGY = "import time\nn = int(input())\ntime.sleep(0.5 if n > 0 else 0)\nprint(n * 2)"
+
+
+def _scripted_llm(mocker, agent, analyses: list[float]):
+    def complete(prompt, **kwargs):
+        if "Architect" in prompt:
+            return "- Algo: math"
+        if "Debugging Agent" in prompt:
+            analyses.append(time.monotonic())
+            return "ROOT CAUSE: negatives"
+        return FIXED if "ROOT CAUSE" in prompt else SLOW_BUGGY
+
+    async def acomplete(prompt, **kwargs):
+        return complete(prompt, **kwargs)
+
+    mocker.patch.object(agent.llm, "complete", side_effect=complete)
+    mocker.patch.object(agent.llm, "acomplete", side_effect=acomplete)
+
+
+def test_pipelined_analysis_overlaps_remaining_tests(mocker):
+    agent = AlphaRepairAgent(max_retries=2, pipeline_analysis=True)
+    analyses: list[float] = []
+    _scripted_llm(mocker, agent, analyses)
+    events: list[str] = []
+    run_tests = agent.sandbox.run_tests
+
+    def tracked_run_tests(*args, on_failure=None, **kwargs):
+        def hook(error_log, failures):
+            on_failure(error_log, failures)
+            if failures == 3:
+                # The log is final; hold the remaining test until the analysis is underway
+                deadline = time.monotonic() + 5
+                while not analyses and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                events.append("analysis running" if analyses else "no analysis")
+
+        result = run_tests(*args, on_failure=hook if on_failure else None, **kwargs)
+        events.append("tests done")
+        return result
+
+    mocker.patch.object(agent.sandbox, "run_tests", side_effect=tracked_run_tests)
+    tests = [{"input": str(-n), "expected": "0"} for n in (1, 2, 3)]
+    tests.append({"input": "5", "expected": "10"})
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=tests)
+
+    assert result["status"] == "SOLVED"
+    # One analysis, started while the last test had yet to run
+    assert len(analyses) == 1
+    assert events[:2] == ["analysis running", "tests done"]
+    assert [s["name"] for s in result["spans"]].count("step_analyze_failure") == 1
+
+
+def test_pipelined_analysis_starts_at_the_sandbox_failure_cap(mocker, capsys):
+    sandbox = Sandbox(timeout_seconds=2, max_failures=1)
+    agent = AlphaRepairAgent(max_retries=1, pipeline_analysis=True, sandbox=sandbox)
+    analyses: list[float] = []
+    _scripted_llm(mocker, agent, analyses)
+
+    agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    # The log never reaches MAX_LOGGED_FAILURES, yet it is final after the first failure
+    assert "[Pipeline] Analyzing failures" in capsys.readouterr().out
+    assert len(analyses) == 1
+
+
+def test_pipelined_analysis_is_refined_when_more_failures_arrive(mocker):
+    agent = AlphaRepairAgent(max_retries=1, pipeline_analysis=True, pipeline_min_failures=1)
+    analyses: list[float] = []
+    _scripted_llm(mocker, agent, analyses)
+    # Both fail, the second one only after the early analysis has started
+    tests = [{"input": "-1", "expected": "0"}, {"input": "5", "expected": "11"}]
+
+    asyncio.run(agent.arun_flow("Double n, 0 for negatives.", tests=tests))
+
+    # The early analysis saw one failure, the final log has two
+    assert len(analyses) == 2
+
+
+def test_unused_early_analysis_leaves_no_span(mocker):
+    agent = AlphaRepairAgent(
+        max_retries=3,
+        pipeline_analysis=True,
+        pipeline_min_failures=1,
+        stagnation_policy="restart",
+        stagnation_window=2,
+    )
+    drafts = iter([BUGGY, BUGGY + "  # still wrong", FIXED])
+
+    def complete(prompt, **kwargs):
+        if "Architect" in prompt:
+            return "- Algo: math"
+        return "ROOT CAUSE: negatives" if "Debugging Agent" in prompt else next(drafts)
+
+    mocker.patch.object(agent.llm, "complete", side_effect=complete)
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    # The second run fails like the first, so the flow restarts without its early analysis
+    assert result["status"] == "SOLVED"
+    assert result["stagnation"][0]["action"] == "restart"
+    assert [s["name"] for s in result["spans"]].count("step_analyze_failure") == 1
+
+
+def test_time_limit_verdicts_are_not_memoized(mocker):
+    agent = AlphaRepairAgent(max_retries=3, sandbox=Sandbox(timeout_seconds=0.5))
+    slow = "import time\ntime.sleep(1)"
+    mocker.patch.object(agent.llm, "complete", side_effect=["- Algo: math", slow, "ROOT", slow])
+    run_tests = mocker.spy(agent.sandbox, "run_tests")
+
+    agent.run_flow("Double n, 0 for negatives.", tests=TESTS[:1])
+
+    # The unchanged repair is sandboxed again instead of reusing the timeout
+    assert run_tests.call_count == 2
+
+
+def test_unchanged_repair_stops_the_flow_early(mocker):
+    agent = AlphaRepairAgent(max_retries=5)
+
+    def complete(prompt, **kwargs):
+        if "Architect" in prompt:
+            return "- Algo: math"
+        return "ROOT CAUSE: negatives" if "Debugging Agent" in prompt else BUGGY
+
+    llm = mocker.patch.object(agent.llm, "complete", side_effect=complete)
+    run_tests = mocker.spy(agent.sandbox, "run_tests")
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    assert result["status"] == "FAILED"
+    assert result["metrics"]["iterations"] == 2
+    # analysis, draft, one root cause + repair; the repaired code is not re-sandboxed
+    assert llm.call_count == 4
+    assert run_tests.call_count == 1
+    assert result["stagnation"] == [
+        {
+            "iter": 2,
+            "kind": "stagnation",
+            "reason": "repair returned the code unchanged",
+            "action": "stop",
+        }
+    ]
+
+
+def test_escalate_policy_raises_temperature_and_resamples(mocker):
+    agent = AlphaRepairAgent(max_retries=3, stagnation_policy="escalate")
+    requests = []
+
+    async def acomplete(prompt, **kwargs):
+        requests.append(kwargs)
+        if "Architect" in prompt:
+            return "- Algo: math"
+        if "Debugging Agent" in prompt:
+            return "ROOT CAUSE: negatives"
+        return FIXED if kwargs.get("temperature") else BUGGY
+
+    mocker.patch.object(agent.llm, "acomplete", side_effect=acomplete)
+
+    result = asyncio.run(agent.arun_flow("Double n, 0 for negatives.", tests=TESTS))
+
+    assert result["status"] == "SOLVED"
+    assert result["solution"] == FIXED
+    assert [e["action"] for e in result["stagnation"]] == ["escalate"]
+    assert requests[-1]["temperature"] == 0.3
+    assert requests[-1]["sample"] == 1
+
+
+def test_restart_policy_drafts_a_fresh_solution(mocker):
+    agent = AlphaRepairAgent(max_retries=4, stagnation_policy="restart")
+    drafts = iter([BUGGY, FIXED])
+
+    def complete(prompt, **kwargs):
+        if "Architect" in prompt:
+            return "- Algo: math"
+        if "Debugging Agent" in prompt:
+            return "ROOT CAUSE: negatives"
+        if "ROOT CAUSE" in prompt:
+            return BUGGY
+        return next(drafts)
+
+    mocker.patch.object(agent.llm, "complete", side_effect=complete)
+
+    result = agent.run_flow("Double n, 0 for negatives.", tests=TESTS)
+
+    assert result["status"] == "SOLVED"
+    assert result["metrics"]["iterations"] == 3
+
+
+class _LegacyPrompts:
+    """A registry written against the pre-prefix signatures, with no shared prompt."""
+
+    semantic_analysis = staticmethod(
+        lambda problem_description: f"Architect: {problem_description}"
+    )
+    generate_solution = staticmethod(lambda problem_desc, analysis: f"Write {problem_desc}")
+    analyze_failure = staticmethod(
+        lambda code, error_log, problem_desc: f"Debugging Agent: {problem_desc}"
+    )
+    targeted_repair = staticmethod(lambda code, root_cause: f"Fix: {root_cause}")
+
+
+def test_legacy_prompt_registry_still_works(mocker):
+    agent = AlphaRepairAgent(max_retries=2, prompt_registry=_LegacyPrompts)
+    prompts = []
+
+    def complete(prompt, **kwargs):
+        prompts.append(prompt)
+        if prompt.startswith("Architect"):
+            return "- Algo: math"
+        return {"Debugging": "ROOT CAUSE: negatives", "Fix: ROOT": FIXED}.get(prompt[:9], BUGGY)
+
+    mocker.patch.object(agent.llm, "complete", side_effect=complete)
+
+    result = agent.run_flow("Double n.", tests=TESTS)
+
+    assert result["status"] == "SOLVED"
+    assert prompts[:3] == ["Architect: Double n.", "Write Double n.", "Debugging Agent: Double n."]
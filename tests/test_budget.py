@@ -0,0 +1,81 @@
+import tempfile
+
+from alphakhulnasoft.budget import PromptBudget
+from alphakhulnasoft.prompts import PromptRegistry
+
+CANDIDATE = f"{tempfile.gettempdir()}/tmpab12cd.py"
+
+
+def _traceback(depth: int) -> str:
+    frames = "".join(
+        f'  File "{CANDIDATE}", line {i}, in f\n    return f(n - 1)\n' for i in range(depth)
+    )
+    return (
+        f"Test 1 ❌: Runtime Error\nTraceback (most recent call last):\n{frames}"
+        "ZeroDivisionError: division by zero\n"
+    )
+
+
+def test_compact_error_log_trims_frames_and_paths():
+    budget = PromptBudget("gpt-4o", max_frames=2)
+
+    log = budget.compact_error_log(_traceback(10))
+
+    assert log.count('  File "solution.py"') == 2
+    assert "[8 frames omitted]" in log
+    assert CANDIDATE not in log
+    assert log.rstrip().endswith("ZeroDivisionError: division by zero")
+
+
+def test_compact_error_log_truncates_huge_io():
+    budget = PromptBudget("gpt-4o", max_line_chars=100)
+    huge = "9" * 100_000
+    log = f"Test 1 ❌: Failed.\n   Input: {huge}\n   Expected: '1'\n   Got: '2'"
+
+    compacted = budget.compact_error_log(log)
+
+    assert len(compacted) < 400
+    assert "chars omitted" in compacted
+    assert "Expected: '1'" in compacted
+
+
+def test_fit_shrinks_step_fields_but_never_context_or_code(mocker):
+    budget = PromptBudget("gpt-4o", max_tokens={"analyze_failure": 1000})
+    mocker.patch.object(budget, "count", side_effect=lambda text: len(text) // 4)
+    code = "print(input())\n" * 50
+    context = PromptRegistry.shared_context("statement " * 100, "- Algo: math")
+
+    kept_context, prompt = budget.fit(
+        "analyze_failure",
+        PromptRegistry.analyze_failure,
+        context=context,
+        code=code,
+        error_log="x" * 3000,
+    )
+    assert kept_context == context
+    assert code in prompt
+
+    # An oversized statement stays whole: it is the prefix every request shares
+    context = PromptRegistry.shared_context("statement " * 2000)
+    kept_context, prompt = budget.fit(
+        "analyze_failure",
+        PromptRegistry.analyze_failure,
+        context=context,
+        code=code,
+        error_log="x" * 3000,
+    )
+    assert kept_context == context
+    assert code in prompt
+    assert "chars omitted" in prompt
+
+
+def test_fit_leaves_small_prompts_alone(mocker):
+    budget = PromptBudget("gpt-4o")
+    count = mocker.spy(budget, "count")
+
+    _, prompt = budget.fit(
+        "targeted_repair", PromptRegistry.targeted_repair, code="x", root_cause="y"
+    )
+
+    assert prompt == PromptRegistry.targeted_repair("x", "y")
+    count.assert_not_called()
@@ -0,0 +1,98 @@
+import pytest
+
+from alphakhulnasoft.alpha_repair import AlphaRepairAgent
+from alphakhulnasoft.cache import CacheMissError, ExecutionCache, ResponseCache, code_hash
+from alphakhulnasoft.llm import LLMError, LLMProvider
+from alphakhulnasoft.sandbox import Sandbox
+
+
+def test_code_hash_only_unifies_line_endings():
+    assert code_hash("print(1)\r\nprint(2)\n") == code_hash("print(1)\nprint(2)\n")
+    assert code_hash("print(1)") != code_hash("print(2)")
+    # Each of these runs differently from its neighbour
+    assert code_hash("   print(1)") != code_hash("print(1)")
+    assert code_hash('print("""a  \nb""")') != code_hash('print("""a\nb""")')
+
+
+def test_sandbox_does_not_cache_time_limit_verdicts():
+    cache = ExecutionCache()
+    sb = Sandbox(timeout_seconds=1, cache=cache)
+    slow = [{"input": "", "expected": ""}]
+
+    assert sb.run_tests("import time; time.sleep(2)", slow)[0] == 0.0
+    assert sb.run_tests("print(1 +", slow)[0] == 0.0
+    assert cache.stats()["entries"] == 0
+
+
+def test_execution_cache_lru_eviction():
+    cache = ExecutionCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"output": key, "error": None})
+    assert cache.get("a") is None
+    assert cache.get("c") == {"output": "c", "error": None}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_execution_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / "executions.db")
+    cache = ExecutionCache(path=path)
+    cache.put("k", {"output": "42\n", "error": None})
+    cache.close()
+
+    reopened = ExecutionCache(path=path)
+    assert reopened.get("k") == {"output": "42\n", "error": None}
+
+
+def test_sandbox_skips_cached_runs(tmp_path):
+    marker = tmp_path / "runs.txt"
+    code = f"open({str(marker)!r}, 'a').write('x')\nprint(int(input()) * 2)\n"
+    test_cases = [{"input": "2", "expected": "4"}, {"input": "3", "expected": "6"}]
+    cache = ExecutionCache()
+    sb = Sandbox(timeout_seconds=2, cache=cache)
+
+    assert sb.run_tests(code, test_cases) == (1.0, "")
+    assert sb.run_tests(code.replace("\n", "\r\n"), test_cases) == (1.0, "")
+    assert marker.read_text() == "xx"
+    assert cache.stats()["hits"] == 2
+
+
+def test_response_cache_ttl_and_size_eviction(mocker):
+    clock = mocker.patch("alphakhulnasoft.cache.time.time", return_value=1000.0)
+    cache = ResponseCache(ttl_seconds=60, max_entries=2)
+    for i, key in enumerate(("a", "b", "c")):
+        clock.return_value = 1000.0 + i
+        cache.put(key, key.upper())
+    assert cache.get("a") is None  # evicted by size
+    assert cache.get("c") == "C"
+
+    clock.return_value = 2000.0
+    assert cache.get("c") is None  # expired
+
+
+def test_llm_provider_replays_cached_responses(tmp_path, mocker):
+    path = str(tmp_path / "responses.db")
+    litellm = mocker.Mock()
+    completion = litellm.completion
+    completion.return_value.choices = [mocker.Mock(message=mocker.Mock(content="print(1)"))]
+    mocker.patch.object(LLMProvider, "_litellm", return_value=litellm)
+
+    recorder = LLMProvider(model="gpt-4o", cache=ResponseCache(path=path))
+    assert recorder.complete("solve it", system_prompt="sys") == "print(1)"
+    assert recorder.complete("solve it", system_prompt="sys") == "print(1)"
+    assert completion.call_count == 1
+
+    replayer = LLMProvider(model="gpt-4o", cache=ResponseCache(path=path, replay_only=True))
+    assert replayer.complete("solve it", system_prompt="sys") == "print(1)"
+    with pytest.raises(LLMError) as miss:
+        replayer.complete("something new")
+    assert isinstance(miss.value.__cause__, CacheMissError)
+    assert completion.call_count == 1
+
+
+def test_replay_miss_fails_the_flow():
+    agent = AlphaRepairAgent(response_cache=ResponseCache(replay_only=True))
+
+    result = agent.run_flow("Double n.", tests=[{"input": "2", "expected": "4"}])
+
+    assert result["status"] == "FAILED"
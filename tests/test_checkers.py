@@ -0,0 +1,43 @@
+import pytest
+
+from alphakhulnasoft.checkers import ScriptChecker, get_checker
+from alphakhulnasoft.sandbox import Sandbox
+
+
+def test_builtin_checkers():
+    assert get_checker(None)("", "1 2\n", "1 2")
+    assert not get_checker("exact")("", "1 2", "1  2")
+    assert get_checker("tokens")("", "1 2\n3", "1  2 3\n")
+    assert not get_checker("tokens")("", "1 2 3", "1 2")
+    assert get_checker("float")("", "0.3333333 x", "0.33333333 x")
+    assert not get_checker("float:1e-9")("", "0.3333333", "0.33333333")
+    assert not get_checker("float")("", "1.0", "abc")
+    assert get_checker("unordered")("", "a\nb\nb\n", "b\n a\nb")
+    assert not get_checker("unordered")("", "a\nb\nb", "a\na\nb")
+    for spec in ("nope", "float:abc", "float:-1", "missing_checker.py"):
+        with pytest.raises(ValueError):
+            get_checker(spec)
+
+
+def test_script_checker(tmp_path):
+    script = tmp_path / "checker.py"
+    script.write_text(
+        "import sys\n"
+        "n = int(open(sys.argv[1]).read())\n"
+        "a, b = map(int, open(sys.argv[3]).read().split())\n"
+        "sys.exit(0 if a + b == n else 1)\n"
+    )
+    checker = get_checker(str(script))
+
+    assert isinstance(checker, ScriptChecker)
+    assert checker("5", "2 3", "1 4")
+    assert not checker("5", "2 3", "1 1")
+
+
+def test_sandbox_uses_per_call_checker():
+    code = "print(*sorted(input().split(), reverse=True), sep='\\n')"
+    tests = [{"input": "a b c", "expected": "a\nb\nc"}]
+    sb = Sandbox()
+
+    assert sb.run_tests(code, tests)[0] == 0.0
+    assert sb.run_tests(code, tests, checker="unordered") == (1.0, "")
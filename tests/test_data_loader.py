@@ -0,0 +1,34 @@
+import json
+
+from alphakhulnasoft.data_loader import DataLoader
+
+
+def _write_problems(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"p{i}", "description": "", "tests": []}) + "\n")
+
+
+def test_load_problems_is_lazy_with_limit_and_offset(tmp_path):
+    path = tmp_path / "problems.jsonl"
+    _write_problems(path, 100)
+    # A corrupt line past the limit is never reached
+    with open(path, "a") as f:
+        f.write("not json\n")
+
+    problems = DataLoader().load_problems(str(path), limit=3, offset=2)
+    assert [p["id"] for p in problems] == ["p2", "p3", "p4"]
+
+
+def test_load_problems_shards_and_filters_by_id(tmp_path):
+    path = tmp_path / "problems.jsonl"
+    _write_problems(path, 12)
+    loader = DataLoader()
+
+    shards = [[p["id"] for p in loader.load_problems(str(path), shard=(k, 3))] for k in range(3)]
+    assert sorted(sum(shards, [])) == sorted(f"p{i}" for i in range(12))
+    assert shards[1] == ["p1", "p4", "p7", "p10"]
+
+    # "p1" also occurs in the p10/p11 lines; the parsed ID decides
+    selected = loader.load_problems(str(path), ids=["p1", "p8"])
+    assert [p["id"] for p in selected] == ["p1", "p8"]
@@ -23,3 +23,13 @@ def test_evaluator_add_result():
     assert len(evaluator.results) == 1
     assert evaluator.results[0]["solved"] is True
     assert evaluator.results[0]["iterations"] == 2
+
+
+def test_evaluator_stage_breakdown(capsys):
+    span = {"name": "step_apply_fix", "duration": 1.5, "prompt_tokens": 10}
+    span |= {"completion_tokens": 5, "cost": 0.01}
+    Evaluator().print_stage_breakdown([{"spans": [span, span]}, {}])
+
+    out = capsys.readouterr().out
+    assert "step_apply_fix" in out
+    assert "20/10" in out
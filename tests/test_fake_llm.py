@@ -0,0 +1,60 @@
+import pytest
+
+from alphakhulnasoft.alpha_repair import AlphaRepairAgent
+from alphakhulnasoft.benchmark import run_benchmark
+from alphakhulnasoft.data_loader import DataLoader
+from alphakhulnasoft.fake_llm import FakeProviderError, get_fake
+from alphakhulnasoft.llm import LLMProvider
+from alphakhulnasoft.results import load_results
+
+
+def test_fake_repair_script_solves_mock_problem_after_one_fix():
+    problem = DataLoader().get_mock_problem()
+    agent = AlphaRepairAgent(model_name="fake/repair")
+
+    result = agent.run_flow(problem["description"], tests=problem["tests"])
+
+    assert result["status"] == "SOLVED"
+    assert result["metrics"]["iterations"] == 2
+    assert result["metrics"]["prompt_tokens"] > 0
+
+
+def test_injected_rate_limit_bursts_are_retried():
+    model = "fake/solve?burst_every=4&burst_length=2&retry_after=0"
+    fake = get_fake(model)
+    provider = LLMProvider(model=model, backoff_seconds=0)
+
+    for _ in range(4):
+        assert "```python" in provider.complete("ACT AS: A 10x Python Developer.")
+    # Call 4 starts the burst: calls 4 and 5 get a 429, call 6 goes through
+    assert fake.calls == 6
+
+    with pytest.raises(FakeProviderError) as excinfo:
+        get_fake("fake/solve?error_rate=1").completion(model="x", messages=[])
+    assert excinfo.value.status_code == 503
+
+
+def test_run_benchmark_end_to_end_offline(tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+
+    run_benchmark(limit=2, results_path=results_path, model="fake/solve", concurrency=2)
+
+    rows = load_results(results_path)
+    assert [row["pass"] for row in rows] == [True, True]
+
+
+def test_crashing_flow_is_recorded_without_stopping_the_others(tmp_path, mocker):
+    results_path = str(tmp_path / "results.jsonl")
+    original = AlphaRepairAgent.arun_flow
+
+    async def arun_flow(self, description, **kwargs):
+        if "even" in description:
+            raise RuntimeError("boom")
+        return await original(self, description, **kwargs)
+
+    mocker.patch.object(AlphaRepairAgent, "arun_flow", arun_flow)
+
+    run_benchmark(limit=2, results_path=results_path, model="fake/solve", concurrency=2)
+
+    rows = sorted(load_results(results_path), key=lambda row: row["id"])
+    assert [row["pass"] for row in rows] == [True, False]
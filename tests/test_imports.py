@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ("huggingface_hub", "litellm", "matplotlib", "pandas", "seaborn")
+# Generous: the core API imports in ~50ms, eager imports used to take over a second
+IMPORT_BUDGET_SECONDS = 0.5
+
+
+def _import_times(statement: str) -> dict[str, int]:
+    """
+    Cumulative import time (µs) per module, from `python -X importtime`.
+    Nested imports keep their indentation, so top-level names start with one space.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.rstrip()] = int(cumulative)
+    return times
+
+
+def test_core_api_import_skips_heavy_dependencies():
+    times = _import_times(
+        "from alphakhulnasoft import AlphaRepairAgent, DataLoader, Evaluator, Sandbox"
+    )
+
+    loaded = {name.strip().split(".")[0] for name in times}
+    assert not loaded.intersection(HEAVY_MODULES)
+    # Top-level entries only; nested ones are already part of their parent's time
+    total = sum(us for name, us in times.items() if name.startswith(" alphakhulnasoft"))
+    assert total / 1e6 < IMPORT_BUDGET_SECONDS
+
+
+def test_lazy_attributes_resolve():
+    import alphakhulnasoft
+
+    assert alphakhulnasoft.Sandbox.__module__ == "alphakhulnasoft.sandbox"
+    assert "AlphaPlotter" in dir(alphakhulnasoft)
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from alphakhulnasoft import llm
+from alphakhulnasoft.llm import LLMError, LLMProvider, RateLimiter
+from alphakhulnasoft.tracing import span
+
+
+def test_rate_limiter_enforces_requests_per_minute(mocker):
+    mocker.patch.object(RateLimiter, "WINDOW_SECONDS", 0.2)
+    limiter = RateLimiter(requests_per_minute=2)
+
+    async def burst() -> float:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await limiter.acquire(10)
+        return loop.time() - start
+
+    # The third request has to wait for the first one to leave the window
+    assert asyncio.run(burst()) >= 0.2
+
+
+def test_sync_calls_share_the_rate_limit(mocker):
+    mocker.patch.object(RateLimiter, "WINDOW_SECONDS", 0.2)
+    provider = LLMProvider(model="fake/solve", rate_limiter=RateLimiter(requests_per_minute=2))
+
+    start = time.monotonic()
+    for _ in range(3):
+        provider.complete("ACT AS: A 10x Python Developer.")
+    assert time.monotonic() - start >= 0.2
+
+
+def test_context_is_sent_as_cacheable_prefix():
+    context = ["PROBLEM:\nadd two numbers", "ANALYSIS:\n- Algo: math"]
+
+    claude = LLMProvider(model="anthropic/claude-3-5-sonnet-20240620")
+    messages = claude._build_messages("fix it", "system", context)
+    blocks = messages[1]["content"]
+    assert [b["text"] for b in blocks] == [*context, "fix it"]
+    assert [("cache_control" in b) for b in blocks] == [True, True, False]
+
+    gpt = LLMProvider(model="gpt-4o")
+    blocks = gpt._build_messages("fix it", "system", context)[1]["content"]
+    assert not any("cache_control" in b for b in blocks)
+    assert gpt._build_messages("hi", None) == [{"role": "user", "content": "hi"}]
+
+
+def test_cached_prompt_tokens_are_recorded(mocker):
+    provider = LLMProvider(model="gpt-4o")
+    usage = SimpleNamespace(
+        prompt_tokens=1200,
+        completion_tokens=10,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1024),
+    )
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=usage
+    )
+    litellm = SimpleNamespace(completion=lambda **k: response, completion_cost=lambda **k: 0.0)
+    mocker.patch.object(LLMProvider, "_litellm", return_value=litellm)
+
+    history: list[dict] = []
+    with span(history, "step_test"):
+        provider.complete("hi", context=["PROBLEM:\n..."])
+
+    assert history[0]["prompt_tokens"] == 1200
+    assert history[0]["cached_tokens"] == 1024
+
+
+def _chunks(text: str, size: int = 7):
+    for i in range(0, len(text), size):
+        delta = SimpleNamespace(content=text[i : i + size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+STREAMED = "Here you go:\n```python\nprint(1)\n```\nThis works because " + "blah " * 500
+
+
+def test_stop_at_code_hangs_up_after_closing_fence(mocker):
+    consumed = []
+
+    def completion(**kwargs):
+        assert kwargs["stream"] is True
+        for chunk in _chunks(STREAMED):
+            consumed.append(chunk)
+            yield chunk
+
+    litellm = SimpleNamespace(completion=completion)
+    mocker.patch.object(LLMProvider, "_litellm", return_value=litellm)
+    provider = LLMProvider(model="gpt-4o")
+
+    text = provider.complete("write code", stop_at_code=True)
+
+    assert text.endswith("print(1)\n```")
+    assert provider.extract_code(text) == "print(1)"
+    assert len(consumed) < 10
+
+
+def test_stop_at_code_skips_non_python_fences(mocker):
+    streamed = "For input\n```text\n-1\n```\nthe answer is 0. Fix:\n" + STREAMED
+    litellm = SimpleNamespace(completion=lambda **kwargs: _chunks(streamed))
+    mocker.patch.object(LLMProvider, "_litellm", return_value=litellm)
+    provider = LLMProvider(model="gpt-4o")
+
+    text = provider.complete("write code", stop_at_code=True)
+
+    assert text.endswith("print(1)\n```")
+    assert provider.extract_code(text) == "print(1)"
+
+
+def test_astop_at_code_reads_whole_stream_without_fence(mocker):
+    async def acompletion(**kwargs):
+        async def stream():
+            for chunk in _chunks("print(1)\nprint(2)"):
+                yield chunk
+
+        return stream()
+
+    litellm = SimpleNamespace(acompletion=acompletion)
+    mocker.patch.object(LLMProvider, "_litellm", return_value=litellm)
+    provider = LLMProvider(model="gpt-4o")
+
+    text = asyncio.run(provider.acomplete("write code", stop_at_code=True))
+
+    assert text == "print(1)\nprint(2)"
+
+
+def _response(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_rate_limits_are_retried_and_bad_requests_are_not(mocker):
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise _StatusError(429)
+        return _response("ok")
+
+    mocker.patch.object(
+        LLMProvider, "_litellm", return_value=SimpleNamespace(completion=completion)
+    )
+    provider = LLMProvider(model="gpt-4o", backoff_seconds=0, timeout=5)
+
+    assert provider.complete("hi") == "ok"
+    assert len(calls) == 3
+    assert calls[0]["timeout"] == 5
+
+    def rejected(**kwargs):
+        calls.append(kwargs)
+        raise _StatusError(400)
+
+    mocker.patch.object(LLMProvider, "_litellm", return_value=SimpleNamespace(completion=rejected))
+    calls.clear()
+    with pytest.raises(LLMError):
+        provider.complete("hi")
+    assert len(calls) == 1
+
+
+def test_slow_call_is_hedged(mocker):
+    mocker.patch.dict(llm._latencies, {"gpt-4o": [0.01] * llm.HEDGE_MIN_SAMPLES})
+    started = []
+
+    async def acompletion(**kwargs):
+        started.append(time.monotonic())
+        # The first request hangs; the duplicate answers right away
+        await asyncio.sleep(10 if len(started) == 1 else 0)
+        return _response(f"answer {len(started)}")
+
+    litellm = SimpleNamespace(acompletion=acompletion)
+    mocker.patch.object(LLMProvider, "_litellm", return_value=litellm)
+    provider = LLMProvider(model="gpt-4o", hedge_quantile=0.95)
+
+    start = time.monotonic()
+    assert asyncio.run(provider.acomplete("hi")) == "answer 2"
+    assert time.monotonic() - start < 1
@@ -0,0 +1,33 @@
+from alphakhulnasoft.perf import compare, run_suite
+
+
+def _report(**values: tuple[float, bool]) -> dict:
+    return {
+        "results": {
+            name: {"value": value, "unit": "", "higher_is_better": higher}
+            for name, (value, higher) in values.items()
+        }
+    }
+
+
+def test_compare_flags_slowdowns_in_either_direction():
+    baseline = _report(throughput=(100.0, True), latency=(10.0, False), gone=(1.0, True))
+    current = _report(throughput=(70.0, True), latency=(10.5, False), new=(1.0, True))
+
+    rows = {row["name"]: row for row in compare(current, baseline, tolerance=0.2)}
+
+    assert set(rows) == {"throughput", "latency"}
+    assert rows["throughput"]["regressed"]
+    assert rows["throughput"]["change"] < -0.2
+    # 5% slower latency is within tolerance
+    assert not rows["latency"]["regressed"]
+    assert rows["latency"]["change"] < 0
+
+
+def test_run_suite_writes_results_with_direction():
+    report = run_suite(quick=True, only=["extract_code"])
+
+    result = report["results"]["extract_code.large_response"]
+    assert result["value"] > 0
+    assert result["higher_is_better"]
+    assert report["meta"]["quick"]
@@ -0,0 +1,78 @@
+import pytest
+
+from alphakhulnasoft.benchmark import run_benchmark
+from alphakhulnasoft.results import ResultSink, load_results, merge_results
+
+
+def test_load_results_ignores_torn_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "a", "pass": true}\n{"id": "b", "pa')
+    assert load_results(str(path)) == [{"id": "a", "pass": True}]
+
+    legacy = tmp_path / "results.json"
+    legacy.write_text('[{"id": "a", "pass": true}]')
+    assert load_results(str(legacy)) == [{"id": "a", "pass": True}]
+
+
+def test_run_benchmark_resumes_from_results_file(tmp_path, mocker):
+    path = str(tmp_path / "results.jsonl")
+    ResultSink(path).write(
+        {
+            "id": "mock-001",
+            "pass": True,
+            "iterations": 1,
+            "confidence": 1.0,
+            "duration": 1.0,
+            "cost_score": 1.0,
+        }
+    )
+    run_flow = mocker.patch(
+        "alphakhulnasoft.benchmark.AlphaRepairAgent.run_flow",
+        return_value={
+            "solution": "",
+            "status": "FAILED",
+            "metrics": {"iterations": 5, "confidence": 0.0, "flow_depth": 5},
+        },
+    )
+
+    assert run_benchmark(limit=2, results_path=path, resume=True) == path
+
+    assert run_flow.call_count == 1
+    assert [row["id"] for row in load_results(path)] == ["mock-001", "mock-002"]
+
+
+def test_run_benchmark_refuses_to_append_a_second_run(tmp_path, mocker):
+    path = str(tmp_path / "results.jsonl")
+    ResultSink(path).write({"id": "mock-001", "pass": True})
+    run_flow = mocker.patch("alphakhulnasoft.benchmark.AlphaRepairAgent.run_flow")
+
+    with pytest.raises(FileExistsError):
+        run_benchmark(limit=2, results_path=path)
+
+    run_flow.assert_not_called()
+    assert len(load_results(path)) == 1
+
+
+def test_merge_results_combines_shards(tmp_path):
+    shard_paths = []
+    for i in range(2):
+        path = str(tmp_path / f"run.shard-{i}-of-2.jsonl")
+        sink = ResultSink(path)
+        for position in range(i, 12, 2):
+            sink.write({"id": f"p{position}", "pass": i == 0, "position": position})
+        shard_paths.append(path)
+
+    out = str(tmp_path / "run.jsonl")
+    rows = merge_results(shard_paths, out)
+    # Dataset order, not string order ("p10" < "p2")
+    assert [row["id"] for row in rows] == [f"p{n}" for n in range(12)]
+    assert load_results(out) == rows
+
+
+def test_result_sink_claim_is_exclusive(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    with ResultSink(path).claim(), pytest.raises(RuntimeError), ResultSink(path).claim():
+        pass
+    # Released afterwards
+    with ResultSink(path).claim():
+        pass
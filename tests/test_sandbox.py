@@ -1,4 +1,9 @@
-from alphakhulnasoft.sandbox import Sandbox
+import os
+import resource
+
+import pytest
+
+from alphakhulnasoft.sandbox import Sandbox, WarmSandbox, is_batch_safe
 
 
 def test_sandbox_simple_success():
@@ -29,3 +34,171 @@ def test_sandbox_timeout():
     pass_rate, log = sb.run_tests(code, test_cases)
     assert pass_rate == 0.0
     assert "Time Limit Exceeded" in log
+
+
+def test_warm_sandbox_matches_sandbox():
+    code = "n = int(input()); print(n * 2)"
+    test_cases = [{"input": str(i), "expected": str(i * 2)} for i in range(5)]
+    test_cases.append({"input": "3", "expected": "7"})
+
+    with WarmSandbox(timeout_seconds=2) as sb:
+        warm = sb.run_tests(code, test_cases)
+    cold = Sandbox(timeout_seconds=2).run_tests(code, test_cases)
+    assert warm[0] == cold[0] == 5 / 6
+    assert "Test 6 ❌: Failed." in warm[1]
+
+
+def test_warm_sandbox_replaces_hung_and_crashed_workers():
+    with WarmSandbox(timeout_seconds=1) as sb:
+        pass_rate, log = sb.run_tests("import time; time.sleep(2)", [{"input": "", "expected": ""}])
+        assert pass_rate == 0.0
+        assert "Time Limit Exceeded" in log
+
+        pass_rate, log = sb.run_tests("import os; os._exit(3)", [{"input": "", "expected": ""}])
+        assert pass_rate == 0.0
+        assert "crashed" in log
+
+        # The pool keeps working after both failures
+        pass_rate, _ = sb.run_tests("print(input())", [{"input": "ok", "expected": "ok"}])
+        assert pass_rate == 1.0
+
+
+def test_warm_sandbox_serves_input_on_fd_0():
+    code = "import os\nfirst = os.read(0, 2).decode()\nprint(first + open(0).read().strip())"
+    test_cases = [{"input": "abcdef", "expected": "abcdef"}, {"input": "xyz", "expected": "xyz"}]
+
+    with WarmSandbox(timeout_seconds=2) as warm, WarmSandbox(batch_tests=True) as batch:
+        for sb in (Sandbox(timeout_seconds=2), warm, batch):
+            assert sb.run_tests(code, test_cases) == (1.0, "")
+
+
+def test_warm_sandbox_isolates_interpreter_wide_patches():
+    patches = [
+        "import builtins\nbuiltins.input = lambda *a: 'hijacked'\nprint(input())",
+        "import sys\nsys.modules['math'] = None\nprint(input())",
+    ]
+    honest = [("print(input())", "ok"), ("import math\nprint(math.isqrt(int(input())))", "3")]
+    tests = {"ok": [{"input": "ok", "expected": "ok"}], "3": [{"input": "9", "expected": "3"}]}
+
+    with WarmSandbox(timeout_seconds=2, pool_size=1) as sb:
+        for patch, (code, expected) in zip(patches, honest, strict=True):
+            sb.run_tests(patch, [{"input": "x", "expected": "x"}])
+            assert sb.run_tests(code, tests[expected]) == (1.0, "")
+
+
+def test_sandbox_parallel_keeps_test_order():
+    sb = Sandbox(timeout_seconds=2, max_workers=4)
+    # Later tests finish first; the log must still list failures by index
+    code = "import time; n = int(input()); time.sleep(0.05 * (8 - n)); print(n)"
+    test_cases = [{"input": str(i), "expected": str(i if i % 2 else -1)} for i in range(8)]
+
+    pass_rate, log = sb.run_tests(code, test_cases)
+    assert pass_rate == 0.5
+    assert log.index("Test 1 ") < log.index("Test 3 ") < log.index("Test 5 ")
+
+
+def test_sandbox_fail_fast_stops_after_max_failures(tmp_path):
+    marker = tmp_path / "runs.txt"
+    code = f"open({str(marker)!r}, 'a').write('x'); print('wrong')"
+    test_cases = [{"input": "", "expected": "right"} for _ in range(10)]
+
+    sb = Sandbox(timeout_seconds=2, max_failures=2)
+    pass_rate, log = sb.run_tests(code, test_cases)
+    assert pass_rate == 0.0
+    assert "Test 2 ❌" in log and "Test 3 ❌" not in log
+    assert marker.read_text() == "xx"
+
+
+def test_sandbox_smoke_subset_gates_full_suite():
+    sb = Sandbox(timeout_seconds=2, smoke_tests=1)
+    code = "n = int(input()); print(n if n < 3 else -n)"
+    test_cases = [{"input": str(i), "expected": str(i)} for i in range(1, 6)]
+
+    # Smoke test passes, so the full suite runs and reports its failures
+    pass_rate, log = sb.run_tests(code, test_cases)
+    assert pass_rate == 2 / 5
+    assert "Test 3 ❌" in log
+
+    # Smoke test fails, so nothing else runs
+    pass_rate, log = sb.run_tests("print(0)", test_cases)
+    assert pass_rate == 0.0
+    assert log.startswith("Test 1 ❌") and "Test 2" not in log
+
+
+LIMIT_CASES = [
+    ("x = bytearray(512 * 1024 * 1024)", "Memory Limit Exceeded"),
+    ("while True: print('spam' * 1000)", "Output Limit Exceeded"),
+    ("while True: pass", "Time Limit Exceeded"),
+]
+
+
+def test_sandbox_resource_limit_verdicts():
+    sb = Sandbox(timeout_seconds=1, memory_limit_mb=256, output_limit_bytes=64 * 1024)
+    for code, verdict in LIMIT_CASES:
+        pass_rate, log = sb.run_tests(code, [{"input": "", "expected": ""}])
+        assert pass_rate == 0.0
+        assert verdict in log
+        assert "Runtime Error" not in log
+
+
+def test_warm_sandbox_resource_limit_verdicts():
+    with WarmSandbox(timeout_seconds=1, memory_limit_mb=256, output_limit_bytes=64 * 1024) as sb:
+        for code, verdict in LIMIT_CASES:
+            pass_rate, log = sb.run_tests(code, [{"input": "", "expected": ""}])
+            assert pass_rate == 0.0
+            assert verdict in log
+
+        # The worker survives a memory/output limit hit
+        pass_rate, _ = sb.run_tests("print(input())", [{"input": "ok", "expected": "ok"}])
+        assert pass_rate == 1.0
+
+
+def test_batched_harness_judges_each_case():
+    code = "import time\nn = int(input())\nif n < 0: time.sleep(5)\nprint(n * 2)"
+    test_cases = [{"input": str(i), "expected": str(i * 2)} for i in range(20)]
+    test_cases[3] = {"input": "-1", "expected": ""}
+    test_cases[7]["expected"] = "wrong"
+
+    with WarmSandbox(timeout_seconds=1, batch_tests=True) as warm:
+        for sb in (Sandbox(timeout_seconds=1, batch_tests=True), warm):
+            pass_rate, log = sb.run_tests(code, test_cases)
+            assert pass_rate == 18 / 20
+            assert "Test 4 ❌: ⏱️ Time Limit Exceeded" in log
+            assert "Test 8 ❌: Failed." in log
+
+
+def test_batched_harness_falls_back_after_worker_crash():
+    code = "import os\nn = int(input())\nif n == 2: os._exit(1)\nprint(n)"
+    test_cases = [{"input": str(i), "expected": str(i)} for i in range(5)]
+
+    with WarmSandbox(timeout_seconds=1, batch_tests=True) as sb:
+        pass_rate, log = sb.run_tests(code, test_cases)
+    assert pass_rate == 4 / 5
+    assert "Test 3 ❌: Runtime Error" in log
+
+
+def test_is_batch_safe():
+    assert is_batch_safe("import math\nprint(math.sqrt(int(input())))")
+    assert is_batch_safe("import sys\ninput = sys.stdin.readline\nprint(input())")
+    assert not is_batch_safe("import sys\nsys.stdout = open('x', 'w')")
+    assert not is_batch_safe("from os import environ\nenviron['A'] = '1'")
+    assert not is_batch_safe("import threading")
+    assert not is_batch_safe("import math\nsetattr(math, 'pi', 3)")
+
+
+def test_sandbox_handles_descriptors_above_1024():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and hard < 1200:
+        pytest.skip("can't open enough file descriptors")
+    if soft != resource.RLIM_INFINITY and soft < 1200:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (1200, hard))
+    filler = [os.dup(0) for _ in range(1100)]  # push the pipes past select()'s FD_SETSIZE
+    try:
+        tests = [{"input": "2", "expected": "4"}]
+        assert Sandbox(timeout_seconds=2).run_tests("print(int(input()) * 2)", tests) == (1.0, "")
+        with WarmSandbox(timeout_seconds=2, pool_size=1) as sb:
+            assert sb.run_tests("print(int(input()) * 2)", tests) == (1.0, "")
+    finally:
+        for fd in filler:
+            os.close(fd)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
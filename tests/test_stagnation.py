@@ -0,0 +1,38 @@
+from alphakhulnasoft.stagnation import code_fingerprint, detect_stagnation, failure_fingerprint
+
+
+def _attempt(code: str, failure: str = "f", pass_rate: float = 0.5) -> dict:
+    return {"code": code_fingerprint(code), "failure": failure, "pass_rate": pass_rate}
+
+
+def test_failure_fingerprint_ignores_values_and_messages():
+    first = (
+        "Test 2 ❌: WRONG_ANSWER\n   Input: 5\n   Expected: 10\n   Got: 11\n"
+        "Test 3 ❌: RUNTIME_ERROR\nTraceback...\nZeroDivisionError: division by zero\n"
+    )
+    second = first.replace("5", "7").replace("division by zero", "integer division by zero")
+    other = first.replace("Test 2", "Test 4")
+
+    assert failure_fingerprint(first) == failure_fingerprint(second)
+    assert failure_fingerprint(first) != failure_fingerprint(other)
+    assert failure_fingerprint("Compilation failed at line 3") == failure_fingerprint(
+        "Compilation failed at line 12"
+    )
+
+
+def test_code_fingerprint_is_exact():
+    assert code_fingerprint("print(1)") == code_fingerprint("print(1)")
+    assert code_fingerprint("   print(1)") != code_fingerprint("print(1)")
+    assert code_fingerprint('print("a  ")') != code_fingerprint('print("a")')
+
+
+def test_detect_stagnation_reasons():
+    assert detect_stagnation([_attempt("a")]) is None
+    assert detect_stagnation([_attempt("a"), _attempt("b")]) is None
+    assert "unchanged" in detect_stagnation([_attempt("a"), _attempt("a")])
+    assert "cycled" in detect_stagnation([_attempt("a"), _attempt("b"), _attempt("a")])
+    assert "same failure" in detect_stagnation([_attempt("a"), _attempt("b"), _attempt("c")])
+    # Same failure signature, but the pass rate is climbing
+    climbing = [_attempt("a", pass_rate=0.2), _attempt("b"), _attempt("c", pass_rate=0.8)]
+    assert detect_stagnation(climbing) is None
+    assert detect_stagnation([_attempt("a", "x"), _attempt("b", "y"), _attempt("c", "x")]) is None
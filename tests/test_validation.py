@@ -0,0 +1,58 @@
+from alphakhulnasoft.sandbox import Sandbox
+from alphakhulnasoft.validation import CodeValidator
+
+
+def test_validator_reports_syntax_errors_with_location():
+    tree, issue = CodeValidator().check("Here is the fix:\nprint(input())")
+
+    assert tree is None
+    assert issue is not None
+    assert issue.kind == "syntax"
+    assert issue.line == 1
+    assert "Compile Error at line 1" in issue.format()
+
+
+def test_validator_rejects_disallowed_imports():
+    validator = CodeValidator()
+    for code in ("import subprocess", "from socket import socket", "__import__('ctypes')"):
+        tree, issue = validator.check(code)
+        assert tree is None
+        assert issue is not None and issue.kind == "import"
+
+    tree, issue = validator.check("import sys\nfrom collections import deque")
+    assert tree is not None and issue is None
+
+
+def test_validator_caches_by_exact_source(mocker):
+    validator = CodeValidator()
+    check = mocker.spy(validator, "_check")
+
+    validator.check("print(1)")
+    assert validator.compiled("print(1)") is validator.compiled("print(1)")
+    assert check.call_count == 1
+    # Same code up to whitespace, but an IndentationError
+    tree, issue = validator.check("   print(1)")
+    assert tree is None and issue is not None
+    assert check.call_count == 2
+
+
+def test_sandbox_runs_the_exact_source_it_was_given():
+    sb = Sandbox()
+    code = 'print("""a  \nb""".split("\\n")[0] + "|")'
+    assert sb.run_tests(code.replace("a  ", "a"), [{"input": "", "expected": "a|"}])[0] == 1.0
+    assert sb.run_tests(code, [{"input": "", "expected": "a  |"}])[0] == 1.0
+
+    # Tracebacks of nested functions still point at the candidate file
+    _, log = sb.run_tests("def f():\n    1 / 0\nf()", [{"input": "", "expected": ""}])
+    assert "line 2, in f" in log and "<candidate>" not in log
+
+
+def test_sandbox_rejects_invalid_code_without_running_it(mocker):
+    sb = Sandbox()
+    run = mocker.spy(sb, "_execute_single_run")
+
+    pass_rate, log = sb.run_tests("def f(:\n    pass", [{"input": "", "expected": ""}])
+
+    assert pass_rate == 0.0
+    assert log.startswith("❌ Compile Error")
+    run.assert_not_called()